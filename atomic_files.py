@@ -0,0 +1,45 @@
+import os
+import json
+import tempfile
+import contextlib
+
+# Atomic file writes: the data goes to a temp file in the target's directory
+# which is renamed over the target, so readers never see a partial file and
+# an interrupted write leaves nothing behind. mkstemp creates its file as
+# 0600 whatever the umask; before the rename it gets the mode a plain open()
+# would have given it, so other users and processes can read it.
+
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextlib.contextmanager
+def atomic_path(path):
+    # Yields the temp path to write; it replaces `path` if the block succeeds
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                                    suffix=".tmp")
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.chmod(tmp_path, 0o666 & ~_UMASK)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write(path, write, binary=True):
+    # `write` is called with the open temp file
+    with atomic_path(path) as tmp_path:
+        if binary:
+            with open(tmp_path, "wb") as f:
+                write(f)
+        else:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                write(f)
+
+
+def atomic_write_json(path, data, indent=2):
+    atomic_write(path, lambda f: json.dump(data, f, ensure_ascii=False,
+                                           indent=indent), binary=False)
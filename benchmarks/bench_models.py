@@ -0,0 +1,157 @@
+import os
+import sys
+import glob
+import json
+import time
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import GroupKFold
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "datasets"))
+import extract_outline as eo  # noqa: E402
+from pdf_features import FEATURE_COLUMNS, feature_matrix  # noqa: E402
+from train_crf_model_custom import (prepare_sequence_data,  # noqa: E402
+                                    train_crf_model)
+from training_store import N_ESTIMATORS  # noqa: E402
+
+LEVELS = ["H1", "H2", "H3"]
+FOLDS = 5
+
+# Helper: extracted line columns of every PDF in input_dir, for timing
+
+
+def pdf_documents(input_dir=eo.INPUT_DIR):
+    return [(pdf_path, eo.extract_pdf_columns(pdf_path))
+            for pdf_path in sorted(glob.glob(os.path.join(input_dir, "*.pdf")))]
+
+# Helper: per-level precision/recall/F1 over all lines
+
+
+def level_scores(y_true, y_pred):
+    y_true, y_pred = np.asarray(y_true), np.asarray(y_pred)
+    scores = {"accuracy": float(np.mean(y_true == y_pred))}
+    for level in LEVELS:
+        tp = np.sum((y_pred == level) & (y_true == level))
+        predicted, actual = np.sum(y_pred == level), np.sum(y_true == level)
+        precision = tp / predicted if predicted else 0.0
+        recall = tp / actual if actual else 0.0
+        f1 = (2 * precision * recall / (precision + recall)
+              if precision + recall else 0.0)
+        scores[level] = {"precision": float(precision), "recall": float(recall),
+                         "f1": float(f1), "support": int(actual)}
+    return scores
+
+# Accuracy: out-of-fold predictions on the training CSV with whole documents
+# held out (GroupKFold on pdf_file). Each fold trains the model the way its
+# training script does: a full RandomForest rebuild, or the CRF with the
+# settings of train_crf_model_custom.py.
+
+
+def held_out_labels(kind, df, folds=FOLDS):
+    groups = df['pdf_file'].astype(str).to_numpy()
+    folds = min(folds, len(np.unique(groups)))
+    y_true, y_pred = [], []
+    for train, test in GroupKFold(n_splits=folds).split(df, groups=groups):
+        train_df, test_df = df.iloc[train], df.iloc[test]
+        if kind == "rf":
+            clf = RandomForestClassifier(n_estimators=N_ESTIMATORS,
+                                         random_state=42,
+                                         class_weight='balanced')
+            clf.fit(train_df[FEATURE_COLUMNS].to_numpy(dtype=np.float32),
+                    train_df['heading_level'].astype(str).to_numpy())
+            y_pred.extend(clf.predict(
+                test_df[FEATURE_COLUMNS].to_numpy(dtype=np.float32)))
+            y_true.extend(test_df['heading_level'].astype(str))
+        else:
+            crf = train_crf_model(*prepare_sequence_data(train_df),
+                                  verbose=False)
+            sequences, labels = prepare_sequence_data(test_df)
+            y_pred.extend(tag for seq in crf.predict(sequences) for tag in seq)
+            y_true.extend(label for seq in labels for label in seq)
+    return y_true, y_pred, folds
+
+# Throughput: features + predict for every PDF with the shipped model,
+# fastest of `repeats` runs
+
+
+def time_model(kind, docs, df, folds=FOLDS, repeats=3):
+    start = time.perf_counter()
+    model, _, _ = eo.load_model(kind)
+    load_seconds = time.perf_counter() - start
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _, cols in docs:
+            eo.predict_lines(model, feature_matrix(cols), cols['page'])
+        best = min(best, time.perf_counter() - start)
+    lines = sum(len(cols['text']) for _, cols in docs)
+    pages = sum(len(np.unique(cols['page'])) for _, cols in docs)
+    y_true, y_pred, folds = held_out_labels(kind, df, folds)
+    return {
+        "benchmark": "models",
+        "timestamp": time.time(),
+        "model": kind,
+        "model_class": type(model).__name__,
+        "documents": len(docs),
+        "pages": pages,
+        "lines": lines,
+        "load_seconds": load_seconds,
+        "seconds": best,
+        "lines_per_second": lines / best if best else 0.0,
+        "pages_per_second": pages / best if best else 0.0,
+        "folds": folds,
+        "scored_lines": len(y_true),
+        "scores": level_scores(y_true, y_pred),
+    }
+
+
+def main(models=("rf", "crf"), input_dir=eo.INPUT_DIR, csv_path=eo.TRAIN_CSV,
+         folds=FOLDS, repeats=3, out=None):
+    docs = pdf_documents(input_dir)
+    if not docs:
+        print(f"No PDFs in {input_dir}", file=sys.stderr)
+        return
+    df = pd.read_csv(csv_path)
+    sink = open(out, "a", encoding="utf-8") if out else sys.stdout
+    print(f"{'model':<6} {'load s':>7} {'lines/s':>10} {'pages/s':>9} "
+          f"{'acc':>6} " + " ".join(f"{'F1 ' + level:>6}" for level in LEVELS),
+          file=sys.stderr)
+    for kind in models:
+        record = time_model(kind, docs, df, folds, repeats)
+        print(json.dumps(record), file=sink, flush=True)
+        scores = record["scores"]
+        print(f"{kind:<6} {record['load_seconds']:>7.3f} "
+              f"{record['lines_per_second']:>10.0f} "
+              f"{record['pages_per_second']:>9.1f} "
+              f"{scores['accuracy']:>6.3f} " +
+              " ".join(f"{scores[level]['f1']:>6.3f}" for level in LEVELS),
+              file=sys.stderr)
+    if out:
+        sink.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Compare RandomForest and CRF throughput on PDFs and "
+                    "held-out accuracy on the training CSV")
+    parser.add_argument('--models', nargs='+', choices=['rf', 'crf'],
+                        default=['rf', 'crf'])
+    parser.add_argument('--input-dir', default=eo.INPUT_DIR,
+                        help='PDFs to time (default: %(default)s)')
+    parser.add_argument('--csv', default=eo.TRAIN_CSV,
+                        help='Labelled lines for the accuracy folds '
+                             '(default: %(default)s)')
+    parser.add_argument('--folds', type=int, default=FOLDS,
+                        help='Cross-validation folds, grouped by pdf_file '
+                             '(default: %(default)s)')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='Timing runs per model; the fastest is reported')
+    parser.add_argument('--out', help='Append JSON-lines results here '
+                                      '(default: stdout)')
+    args = parser.parse_args()
+    main(args.models, args.input_dir, args.csv, args.folds, args.repeats,
+         args.out)
@@ -0,0 +1,191 @@
+import os
+import io
+import sys
+import json
+import time
+import random
+import hashlib
+import tempfile
+import contextlib
+import functools
+import pymupdf as fitz  # PyMuPDF
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import extract_outline as eo  # noqa: E402
+from outline_cache import OutlineCache  # noqa: E402
+from pdf_features import feature_matrix  # noqa: E402
+
+SIZES = [1, 10, 50, 200, 1000, 2000]
+LINES_PER_PAGE = 40
+HEADING_DENSITY = 0.05
+FONTS = ["helv", "tiro"]
+# Heading levels: (font size, bold font variant)
+HEADING_STYLES = {"H1": 18, "H2": 14, "H3": 12}
+BOLD_FONTS = {"helv": "hebo", "tiro": "tibo", "cour": "cobo"}
+BODY_SIZE = 10
+WORDS = ("data model system report results analysis method process design "
+         "section value table figure review project plan quality test").split()
+
+# Synthetic PDF: `lines_per_page` lines per page, a `heading_density` share
+# of them headings (bold, larger), body text cycling through `fonts`.
+
+
+def generate_pdf(path, pages, lines_per_page=LINES_PER_PAGE,
+                 heading_density=HEADING_DENSITY, fonts=FONTS, seed=0):
+    rng = random.Random(seed)
+    doc = fitz.open()
+    spacing = (792 - 2 * 60) / lines_per_page
+    for page_num in range(pages):
+        page = doc.new_page(width=612, height=792)
+        y = 60
+        for line in range(lines_per_page):
+            font = fonts[(page_num + line) % len(fonts)]
+            if rng.random() < heading_density:
+                level = rng.choice(list(HEADING_STYLES))
+                text = f"{page_num + 1}.{line} " + " ".join(
+                    rng.choice(WORDS).title() for _ in range(rng.randint(1, 4)))
+                page.insert_text((72, y), text, fontsize=HEADING_STYLES[level],
+                                 fontname=BOLD_FONTS.get(font, "hebo"))
+            else:
+                text = " ".join(rng.choice(WORDS)
+                                for _ in range(rng.randint(6, 14)))
+                page.insert_text((72, y), text.capitalize() + ".",
+                                 fontsize=BODY_SIZE, fontname=font)
+            y += spacing
+    doc.save(path)
+    doc.close()
+
+
+def corpus_pdf(pdf_dir, pages, lines_per_page, heading_density, fonts):
+    params = f"{pages}-{lines_per_page}-{heading_density}-{','.join(fonts)}"
+    name = hashlib.sha1(params.encode()).hexdigest()[:10]
+    path = os.path.join(pdf_dir, f"synthetic-{pages}p-{name}.pdf")
+    if not os.path.exists(path):
+        generate_pdf(path, pages, lines_per_page, heading_density, fonts)
+    return path
+
+# Per-stage timings of the serial pipeline for one PDF
+
+
+def time_stages(pdf_path, model, label_map, inv_label_map, out_dir):
+    stages = {}
+    start = time.perf_counter()
+    cols = eo.extract_pdf_columns(pdf_path)
+    stages["extract"] = time.perf_counter() - start
+    start = time.perf_counter()
+    X = feature_matrix(cols)
+    stages["features"] = time.perf_counter() - start
+    start = time.perf_counter()
+    preds = model.predict(X)
+    stages["predict"] = time.perf_counter() - start
+    start = time.perf_counter()
+    output = eo.outline_output(eo.line_records(cols), preds, inv_label_map)
+    stages["build_outline"] = time.perf_counter() - start
+    start = time.perf_counter()
+    with open(os.path.join(out_dir, "out.json"), "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+    stages["write_json"] = time.perf_counter() - start
+    stages["total"] = sum(stages.values())
+    return stages, len(cols['text']), len(output["outline"])
+
+# End-to-end timings of the optional modes, for comparing against serial
+
+
+def time_mode(mode, pdf_path, model, label_map, inv_label_map, workers,
+              cache_dir):
+    process = functools.partial(eo.process_pdf, model=model,
+                                label_map=label_map,
+                                inv_label_map=inv_label_map)
+    cache = None
+    if mode == "prune":
+        process = functools.partial(process, prune_words=eo.PRUNE_WORDS)
+    elif mode == "page-window":
+        process = functools.partial(process, page_window=eo.PAGE_WINDOW)
+    elif mode == "cache-warm":
+        cache = OutlineCache(cache_dir, "bench", variant="bench")
+        process = functools.partial(process, cache=cache)
+        process(pdf_path)  # populate
+    emit = lambda pdf_path, output: None  # noqa: E731
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "workers":
+            eo.run_parallel([pdf_path], model, label_map, inv_label_map,
+                            workers, emit=emit)
+        else:
+            eo.run_serial([pdf_path], process, emit)
+    return time.perf_counter() - start
+
+
+def main(sizes=SIZES, lines_per_page=LINES_PER_PAGE,
+         heading_density=HEADING_DENSITY, fonts=FONTS, repeats=1, modes=(),
+         workers=os.cpu_count() or 1, pdf_dir=None, out=None):
+    pdf_dir = pdf_dir or os.path.join(tempfile.gettempdir(), "outline-bench")
+    os.makedirs(pdf_dir, exist_ok=True)
+    model, label_map, inv_label_map = eo.load_rf_model()
+    sink = open(out, "a", encoding="utf-8") if out else sys.stdout
+    print(f"{'pages':>6} {'lines':>7} {'extract':>8} {'features':>8} "
+          f"{'predict':>8} {'outline':>8} {'write':>8} {'total':>8}  (seconds)",
+          file=sys.stderr)
+    with tempfile.TemporaryDirectory() as scratch:
+        for pages in sizes:
+            pdf_path = corpus_pdf(pdf_dir, pages, lines_per_page,
+                                  heading_density, fonts)
+            runs = [time_stages(pdf_path, model, label_map, inv_label_map,
+                                scratch) for _ in range(repeats)]
+            stages = {name: min(r[0][name] for r in runs) for name in runs[0][0]}
+            record = {
+                "benchmark": "pipeline",
+                "timestamp": time.time(),
+                "pages": pages,
+                "lines_per_page": lines_per_page,
+                "heading_density": heading_density,
+                "fonts": list(fonts),
+                "pdf_bytes": os.path.getsize(pdf_path),
+                "lines": runs[0][1],
+                "headings": runs[0][2],
+                "model": type(model).__name__,
+                "stages": stages,
+                "modes": {},
+            }
+            for mode in modes:
+                cache_dir = os.path.join(scratch, f"cache-{pages}")
+                record["modes"][mode] = min(
+                    time_mode(mode, pdf_path, model, label_map, inv_label_map,
+                              workers, cache_dir) for _ in range(repeats))
+            print(json.dumps(record), file=sink, flush=True)
+            print(f"{pages:>6} {record['lines']:>7} " + " ".join(
+                f"{stages[name]:>8.3f}" for name in
+                ("extract", "features", "predict", "build_outline",
+                 "write_json", "total")), file=sys.stderr)
+            if modes:
+                print("       " + "  ".join(
+                    f"{mode}={seconds:.3f}"
+                    for mode, seconds in record["modes"].items()),
+                    file=sys.stderr)
+    if out:
+        sink.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Benchmark the outline pipeline on synthetic PDFs")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='Page counts to benchmark (default: %(default)s)')
+    parser.add_argument('--lines-per-page', type=int, default=LINES_PER_PAGE)
+    parser.add_argument('--heading-density', type=float, default=HEADING_DENSITY,
+                        help='Share of lines that are headings')
+    parser.add_argument('--fonts', nargs='+', default=FONTS,
+                        help='Base-14 body fonts to cycle through')
+    parser.add_argument('--repeats', type=int, default=1,
+                        help='Runs per size; the fastest is reported')
+    parser.add_argument('--modes', nargs='*', default=[],
+                        choices=['prune', 'page-window', 'cache-warm', 'workers'],
+                        help='Also time these end-to-end modes per size')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--pdf-dir', help='Where generated PDFs are kept')
+    parser.add_argument('--out', help='Append JSON-lines results here '
+                                      '(default: stdout)')
+    args = parser.parse_args()
+    main(args.sizes, args.lines_per_page, args.heading_density, args.fonts,
+         args.repeats, args.modes, args.workers, args.pdf_dir, args.out)
@@ -0,0 +1,180 @@
+import os
+import sys
+import json
+import time
+import resource
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compact_forest import (COMPACT_MODEL_PATH, CompactForest,  # noqa: E402
+                            mapped_model)
+from pdf_features import FEATURE_COLUMNS  # noqa: E402
+
+WORKERS = [1, 2, 4, 8]
+MODES = ["none", "load", "mapped"]
+ROWS = 20000
+# Seconds each probe holds its worker, so every worker gets exactly one
+HOLD_SECONDS = 0.5
+
+# Memory of this process in MiB: RSS, PSS (shared pages split between the
+# processes mapping them) and USS (pages only this process holds). PSS and
+# USS need Linux's smaps_rollup; elsewhere only peak RSS is reported.
+
+
+def memory_mb():
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = {line.split(":")[0]: int(line.split()[1])
+                      for line in f if line.split()[-1:] == ["kB"]}
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rss = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+        return {"rss": rss, "pss": None, "uss": None}
+    return {"rss": fields["Rss"] / 1024, "pss": fields["Pss"] / 1024,
+            "uss": (fields["Private_Clean"] + fields["Private_Dirty"]) / 1024}
+
+# Helper: a forest K times the size of `model`, its trees repeated, standing
+# in for larger production forests
+
+
+def replicate_forest(model, k):
+    nodes, leaves = len(model.feature), len(model.leaf_proba)
+    leaf = model.feature < 0
+    arrays = {
+        'feature': np.tile(model.feature, k),
+        'threshold': np.tile(model.threshold, k),
+        'left': np.concatenate([np.where(leaf, model.left + i * leaves,
+                                         model.left + i * nodes)
+                                for i in range(k)]).astype(np.int32),
+        'right': np.concatenate([np.where(leaf, -1, model.right + i * nodes)
+                                 for i in range(k)]).astype(np.int32),
+        'leaf_proba': np.tile(model.leaf_proba, (k, 1)),
+        'roots': np.concatenate([model.roots + i * nodes for i in range(k)]),
+        'classes': model.classes_, 'labels': np.asarray(model.labels),
+        'feature_set_version': np.asarray(model.feature_set_version),
+        'max_depth': np.asarray(model.max_depth),
+        'source_digest': np.asarray(model.source_digest),
+    }
+    return CompactForest(arrays)
+
+# Worker side: the initializer loads the model the way `mode` says and times
+# it; the probe predicts, then reports startup time and memory
+
+
+_worker = {}
+
+
+def _init_worker(mode, source):
+    start = time.perf_counter()
+    if mode == "load":
+        _worker["model"] = CompactForest.load(source)
+    elif mode == "mapped":
+        _worker["model"] = CompactForest.load_mapped(source)
+    _worker["startup"] = time.perf_counter() - start
+
+
+def _probe(X):
+    start = time.perf_counter()
+    if "model" in _worker:
+        _worker["model"].predict(X)
+    time.sleep(max(0.0, HOLD_SECONDS - (time.perf_counter() - start)))
+    return os.getpid(), _worker["startup"], memory_mb()
+
+
+def measure(mode, source, workers, X, context):
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker,
+                             initargs=(mode, source)) as pool:
+        results = [f.result() for f in [pool.submit(_probe, X)
+                                        for _ in range(workers)]]
+    per_worker = {pid: (startup, mem) for pid, startup, mem in results}
+    mems = [mem for _, mem in per_worker.values()]
+
+    def mean(name):
+        values = [m[name] for m in mems if m[name] is not None]
+        return sum(values) / len(values) if values else None
+    return {
+        "benchmark": "workers",
+        "timestamp": time.time(),
+        "mode": mode,
+        "workers": workers,
+        "measured_workers": len(per_worker),
+        "startup_ms": 1000 * sum(s for s, _ in per_worker.values()) /
+        len(per_worker),
+        "rss_mb": mean("rss"),
+        "pss_mb": mean("pss"),
+        "uss_mb": mean("uss"),
+        "total_pss_mb": (sum(m["pss"] for m in mems)
+                         if mems[0]["pss"] is not None else None),
+    }
+
+
+def main(workers=WORKERS, modes=MODES, model_path=COMPACT_MODEL_PATH,
+         replicate=1, rows=ROWS, start_method=None, out=None):
+    model = CompactForest.load(model_path)
+    if replicate > 1:
+        model = replicate_forest(model, replicate)
+    X = np.random.default_rng(0).random(
+        (rows, len(FEATURE_COLUMNS)), dtype=np.float32) * 100
+    context = multiprocessing.get_context(start_method)
+    sink = open(out, "a", encoding="utf-8") if out else sys.stdout
+    print(f"{model.n_trees} trees, {len(model.feature)} nodes, "
+          f"{context.get_start_method()} workers", file=sys.stderr)
+    print(f"{'mode':<7} {'workers':>7} {'startup ms':>10} {'RSS MB':>8} "
+          f"{'PSS MB':>8} {'USS MB':>8} {'total PSS':>10}", file=sys.stderr)
+    with tempfile.TemporaryDirectory() as scratch, mapped_model(model) as mapped:
+        npz_path = os.path.join(scratch, "model.npz")
+        np.savez_compressed(npz_path, **{
+            'feature': model.feature, 'threshold': model.threshold,
+            'left': model.left, 'right': model.right,
+            'leaf_proba': model.leaf_proba, 'roots': model.roots,
+            'classes': model.classes_, 'labels': np.asarray(model.labels),
+            'feature_set_version': np.asarray(model.feature_set_version),
+            'max_depth': np.asarray(model.max_depth),
+            'source_digest': np.asarray(model.source_digest)})
+        sources = {"none": None, "load": npz_path, "mapped": mapped}
+        for n in workers:
+            for mode in modes:
+                record = measure(mode, sources[mode], n, X, context)
+                record.update(trees=model.n_trees, rows=rows,
+                              start_method=context.get_start_method())
+                print(json.dumps(record), file=sink, flush=True)
+
+                def fmt(value, width):
+                    return f"{'-':>{width}}" if value is None else \
+                        f"{value:>{width}.1f}"
+                print(f"{mode:<7} {n:>7} {record['startup_ms']:>10.2f} "
+                      f"{fmt(record['rss_mb'], 8)} {fmt(record['pss_mb'], 8)} "
+                      f"{fmt(record['uss_mb'], 8)} "
+                      f"{fmt(record['total_pss_mb'], 10)}", file=sys.stderr)
+    if out:
+        sink.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Per-worker startup time and memory with the forest "
+                    "loaded per worker vs. mapped from one shared copy")
+    parser.add_argument('--workers', type=int, nargs='+', default=WORKERS,
+                        help='Pool sizes to measure (default: %(default)s)')
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES,
+                        help='none: no model (baseline); load: each worker '
+                             'loads the .npz; mapped: workers map one copy')
+    parser.add_argument('--model', default=COMPACT_MODEL_PATH,
+                        help='Compact .npz model (default: %(default)s)')
+    parser.add_argument('--replicate', type=int, default=1,
+                        help='Repeat the trees K times to stand in for a '
+                             'larger forest')
+    parser.add_argument('--rows', type=int, default=ROWS,
+                        help='Rows each worker predicts before measuring')
+    parser.add_argument('--start-method', choices=['fork', 'spawn',
+                                                   'forkserver'])
+    parser.add_argument('--out', help='Append JSON-lines results here '
+                                      '(default: stdout)')
+    args = parser.parse_args()
+    main(args.workers, args.modes, args.model, args.replicate, args.rows,
+         args.start_method, args.out)
@@ -0,0 +1,260 @@
+import os
+import sys
+import time
+import pickle
+import shutil
+import hashlib
+import tempfile
+import contextlib
+import subprocess
+import numpy as np
+
+from pdf_features import FEATURE_SET_VERSION
+
+# Model files live next to the code, wherever the process is started from
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "datasets", "final_datasets")
+MODEL_PATH = os.path.join(MODEL_DIR, "rf_headings_model_custom.pkl")
+COMPACT_MODEL_PATH = os.path.join(MODEL_DIR, "rf_headings_model_custom.npz")
+
+# Rows per traversal batch; bounds the (trees x rows x classes) leaf buffer
+PREDICT_BATCH = 4096
+
+# Array-backed RandomForest: all trees' nodes concatenated into flat arrays.
+# Internal nodes hold a feature index and threshold; leaves have feature -1
+# and their `left` entry points at a row of `leaf_proba`. Prediction walks
+# every tree for every row at once and reproduces sklearn's predict exactly.
+
+
+class CompactForest:
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.leaf_proba = arrays['leaf_proba']
+        self.roots = arrays['roots'].astype(np.intp)
+        self.classes_ = arrays['classes']
+        self.labels = [str(label) for label in arrays['labels']]
+        self.feature_set_version = str(arrays['feature_set_version'])
+        self.max_depth = int(arrays['max_depth'])
+        # SHA-256 of the pickle this was exported from ('' if unknown)
+        self.source_digest = str(arrays['source_digest'])
+        self.n_trees = len(self.roots)
+        # Traversal tables: leaves point back at themselves with an infinite
+        # threshold, so every row can take exactly max_depth steps. A mapped
+        # copy (save_mapped) carries them prebuilt.
+        if 'traverse_feature' in arrays:
+            self._feature = arrays['traverse_feature']
+            self._threshold = arrays['traverse_threshold']
+            self._left = arrays['traverse_left']
+            self._right = arrays['traverse_right']
+            return
+        leaf = self.feature < 0
+        nodes = np.arange(len(leaf))
+        self._feature = np.where(leaf, 0, self.feature).astype(np.intp)
+        self._threshold = np.where(leaf, np.inf, self.threshold)
+        self._left = np.where(leaf, nodes, self.left).astype(np.intp)
+        self._right = np.where(leaf, nodes, self.right).astype(np.intp)
+
+    @classmethod
+    def load(cls, path=COMPACT_MODEL_PATH):
+        with np.load(path, allow_pickle=False) as data:
+            return cls({name: data[name] for name in data.files})
+
+    # Memory-mapped form: every array, traversal tables included, as a raw
+    # .npy in one directory. Processes loading it share the same read-only
+    # page-cache pages instead of each holding a copy, and loading does no
+    # decompression or table building.
+
+    def save_mapped(self, directory):
+        arrays = {
+            'feature': self.feature, 'threshold': self.threshold,
+            'left': self.left, 'right': self.right,
+            'leaf_proba': self.leaf_proba, 'roots': self.roots,
+            'classes': self.classes_, 'labels': np.asarray(self.labels),
+            'feature_set_version': np.asarray(self.feature_set_version),
+            'max_depth': np.asarray(self.max_depth),
+            'source_digest': np.asarray(self.source_digest),
+            'traverse_feature': self._feature,
+            'traverse_threshold': self._threshold,
+            'traverse_left': self._left, 'traverse_right': self._right,
+        }
+        os.makedirs(directory, exist_ok=True)
+        for name, array in arrays.items():
+            np.save(os.path.join(directory, name + ".npy"), array,
+                    allow_pickle=False)
+
+    @classmethod
+    def load_mapped(cls, directory):
+        # Plain ndarray views onto the read-only maps
+        return cls({name[:-len(".npy")]: np.asarray(np.load(
+                        os.path.join(directory, name), mmap_mode='r',
+                        allow_pickle=False))
+                    for name in os.listdir(directory) if name.endswith(".npy")})
+
+    def label_maps(self):
+        label_map = {label: int(c) for label, c in zip(self.labels, self.classes_)}
+        inv_label_map = {i: label for label, i in label_map.items()}
+        return label_map, inv_label_map
+
+    def apply(self, X, n_trees=None):
+        # Leaf row reached in each tree, shape (n_trees, n_rows). Features are
+        # compared as float32 values widened to float64, as sklearn does.
+        X = np.asarray(X, dtype=np.float32)
+        flat = X.astype(np.float64).ravel()
+        node = np.repeat(self.roots[:n_trees, None], len(X), axis=1)
+        row_base = (np.arange(len(X)) * X.shape[1])[None, :]
+        for _ in range(self.max_depth):
+            go_left = (flat[row_base + self._feature[node]] <=
+                       self._threshold[node])
+            node = np.where(go_left, self._left[node], self._right[node])
+        return self.left[node]
+
+    def predict_proba(self, X, n_trees=None):
+        X = np.asarray(X, dtype=np.float32)
+        n_trees = min(n_trees or self.n_trees, self.n_trees)
+        proba = np.zeros((len(X), len(self.classes_)), dtype=np.float64)
+        for start in range(0, len(X), PREDICT_BATCH):
+            leaves = self.apply(X[start:start + PREDICT_BATCH], n_trees)
+            batch = proba[start:start + PREDICT_BATCH]
+            # Accumulate in tree order, like sklearn, so ties break the same
+            for tree_leaves in leaves:
+                batch += self.leaf_proba[tree_leaves]
+        proba /= n_trees
+        return proba
+
+    def predict(self, X, n_trees=None):
+        if len(X) == 0:
+            return self.classes_[:0]
+        return self.classes_.take(np.argmax(self.predict_proba(X, n_trees),
+                                            axis=1))
+
+# Helper: temporary mapped copy of a model for a worker pool; yields the
+# directory to pass to CompactForest.load_mapped and removes it afterwards.
+# /dev/shm is used when present so the copy never touches disk.
+
+
+@contextlib.contextmanager
+def mapped_model(model):
+    shm = "/dev/shm"
+    directory = tempfile.mkdtemp(prefix="compact-forest-",
+                                 dir=shm if os.path.isdir(shm) else None)
+    try:
+        model.save_mapped(directory)
+        yield directory
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+# Export a fitted sklearn RandomForestClassifier to the compact format
+
+
+def export_forest(clf, inv_label_map, path=COMPACT_MODEL_PATH,
+                  source_digest=""):
+    feature, threshold, left, right, leaf_proba, roots = [], [], [], [], [], []
+    offset = 0
+    n_leaves = 0
+    for estimator in clf.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left < 0
+        leaf_rows = np.cumsum(is_leaf) - 1 + n_leaves
+        proba = tree.value[is_leaf, 0, :clf.n_classes_]
+        normalizer = proba.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        roots.append(offset)
+        feature.append(np.where(is_leaf, -1, tree.feature))
+        threshold.append(np.where(is_leaf, 0.0, tree.threshold))
+        left.append(np.where(is_leaf, leaf_rows, tree.children_left + offset))
+        right.append(np.where(is_leaf, -1, tree.children_right + offset))
+        leaf_proba.append(proba / normalizer)
+        offset += tree.node_count
+        n_leaves += int(is_leaf.sum())
+    np.savez_compressed(
+        path,
+        feature=np.concatenate(feature).astype(np.int16),
+        threshold=np.concatenate(threshold).astype(np.float64),
+        left=np.concatenate(left).astype(np.int32),
+        right=np.concatenate(right).astype(np.int32),
+        leaf_proba=np.concatenate(leaf_proba).astype(np.float64),
+        roots=np.asarray(roots, dtype=np.int32),
+        classes=np.asarray(clf.classes_),
+        labels=np.asarray([inv_label_map[c] for c in clf.classes_]),
+        feature_set_version=np.asarray(FEATURE_SET_VERSION),
+        max_depth=np.asarray(max(e.tree_.max_depth for e in clf.estimators_)),
+        source_digest=np.asarray(source_digest),
+    )
+    print(f"Compact model saved to {path}")
+
+
+def export_pickle(model_path=MODEL_PATH, out_path=COMPACT_MODEL_PATH):
+    with open(model_path, 'rb') as f:
+        raw = f.read()
+    data = pickle.loads(raw)
+    export_forest(data['model'], data['inv_label_map'], out_path,
+                  hashlib.sha256(raw).hexdigest())
+
+# Benchmark: cold start, file size and predict latency of both formats
+
+
+_STARTUP_SNIPPET = (
+    "import time; t = time.perf_counter(); import extract_outline; "
+    "extract_outline.load_rf_model(compact={compact}); "
+    "print(time.perf_counter() - t)"
+)
+
+
+def benchmark(train_csv, repeats=5):
+    import pandas as pd
+    from pdf_features import feature_matrix
+    X = feature_matrix(pd.read_csv(train_csv, keep_default_na=False))
+    with open(MODEL_PATH, 'rb') as f:
+        sk_model = pickle.load(f)['model']
+    compact = CompactForest.load()
+    if not np.array_equal(sk_model.predict(X), compact.predict(X)):
+        print("WARNING: compact predictions differ from sklearn")
+    results = {}
+    for name, path, model, flag in (
+            ("pickle", MODEL_PATH, sk_model, False),
+            ("compact", COMPACT_MODEL_PATH, compact, True)):
+        startup = []
+        for _ in range(repeats):
+            out = subprocess.run(
+                [sys.executable, "-W", "ignore", "-c",
+                 _STARTUP_SNIPPET.format(compact=flag)],
+                capture_output=True, text=True, check=True)
+            startup.append(float(out.stdout.strip().splitlines()[-1]))
+        latency = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model.predict(X)
+            latency.append(time.perf_counter() - start)
+        results[name] = {
+            "file_bytes": os.path.getsize(path),
+            "startup_seconds": min(startup),
+            "predict_seconds": min(latency),
+            "rows": len(X),
+        }
+    for name, r in results.items():
+        print(f"{name:8s} {r['file_bytes'] / 1024:8.1f} KiB  "
+              f"startup {r['startup_seconds'] * 1000:7.1f} ms  "
+              f"predict {r['rows']} rows {r['predict_seconds'] * 1000:7.1f} ms")
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Export the RandomForest to a compact .npz and benchmark it")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export_cmd = sub.add_parser('export', help='Convert the pickled forest')
+    export_cmd.add_argument('--model', default=MODEL_PATH)
+    export_cmd.add_argument('--out', default=COMPACT_MODEL_PATH)
+    bench_cmd = sub.add_parser('bench', help='Compare pickle and compact paths')
+    bench_cmd.add_argument('--train-csv', default=os.path.join(
+        "datasets", "final_datasets", "custom_train.csv"))
+    bench_cmd.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    if args.command == 'export':
+        export_pickle(args.model, args.out)
+    else:
+        benchmark(args.train_csv, args.repeats)
@@ -0,0 +1,79 @@
+import os
+import pickle
+import numpy as np
+
+from compact_forest import MODEL_DIR
+from pdf_features import FEATURE_COLUMNS
+
+CRF_MODEL_PATH = os.path.join(MODEL_DIR, "crf_headings_model.pkl")
+
+# Page sequences per CRF.predict call; bounds the feature dicts held at once
+PREDICT_PAGES = 256
+REL_Y = FEATURE_COLUMNS.index('rel_y')
+
+# Helper: CRF sequences from columnar data. Lines are grouped by `keys`
+# (e.g. pdf_file, page) and ordered top to bottom by rel_y; each group is one
+# sequence. Returns the row order and the (start, stop) of every group in it.
+
+
+def page_runs(rel_y, *keys):
+    keys = [np.asarray(key) for key in keys]
+    order = np.lexsort([np.asarray(rel_y)] + keys[::-1])
+    if not len(order):
+        return order, []
+    change = np.zeros(len(order), dtype=bool)
+    change[0] = True
+    for key in keys:
+        key = key[order]
+        change[1:] |= key[1:] != key[:-1]
+    starts = np.flatnonzero(change)
+    stops = np.append(starts[1:], len(order))
+    return order, list(zip(starts.tolist(), stops.tolist()))
+
+
+def sequence_dicts(X, rows, runs, names=FEATURE_COLUMNS):
+    # One list of {feature: value} dicts per run, built from a single
+    # tolist() of the selected rows. Zero values are left out: an attribute
+    # with value 0 adds nothing to a CRF score.
+    idx = [FEATURE_COLUMNS.index(name) for name in names]
+    values = np.asarray(X)[rows][:, idx].tolist()
+    items = [{name: v for name, v in zip(names, row) if v} for row in values]
+    return [items[start:stop] for start, stop in runs]
+
+# sklearn_crfsuite CRF behind the same predict-to-class-index interface as
+# the forests. predict() needs the keys that split lines into sequences.
+
+
+class CrfModel:
+    def __init__(self, crf):
+        self.crf = crf
+        self.labels = sorted(str(label) for label in crf.classes_)
+        # Only features the model has weights for are passed to the tagger
+        known = set(crf.attributes_)
+        self.columns = [name for name in FEATURE_COLUMNS if name in known]
+
+    @classmethod
+    def load(cls, path=CRF_MODEL_PATH):
+        with open(path, 'rb') as f:
+            return cls(pickle.load(f))
+
+    def label_maps(self):
+        label_map = {label: i for i, label in enumerate(self.labels)}
+        inv_label_map = {i: label for label, i in label_map.items()}
+        return label_map, inv_label_map
+
+    def predict(self, X, *keys):
+        X = np.asarray(X)
+        label_map, _ = self.label_maps()
+        preds = np.empty(len(X), dtype=np.int64)
+        order, runs = page_runs(X[:, REL_Y], *keys)
+        for first in range(0, len(runs), PREDICT_PAGES):
+            batch = runs[first:first + PREDICT_PAGES]
+            lo, hi = batch[0][0], batch[-1][1]
+            rows = order[lo:hi]
+            sequences = sequence_dicts(
+                X, rows, [(start - lo, stop - lo) for start, stop in batch],
+                self.columns)
+            tags = self.crf.predict(sequences)
+            preds[rows] = [label_map[tag] for seq in tags for tag in seq]
+        return preds
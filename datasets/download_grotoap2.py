@@ -1,127 +1,147 @@
-import fitz  # PyMuPDF
-import glob
+import pymupdf as fitz  # PyMuPDF
+import io
 import os
-import requests
+import csv
+import sys
 import zipfile
-import pandas as pd
-from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_features import collect_lines, training_columns  # noqa: E402
+from training_shards import shard_path, write_csv, write_shard  # noqa: E402
 
 GROTOAP2_URL = "https://s3-us-west-2.amazonaws.com/ai2-s2-research-public/grotoap2/grotoap2-updated.zip"
 DATA_DIR = "datasets/grotoap2"
 PROCESSED_CSV = "datasets/grotoap2_processed/grotoap2_enhanced.csv"
+SHARD_DIR = "datasets/grotoap2_processed/shards"
 ZIP_PATH = os.path.join(DATA_DIR, "grotoap2-updated.zip")
 
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs("datasets/grotoap2_processed", exist_ok=True)
-
 # Download GROTOAP2 zip file with streaming
-if not os.path.exists(ZIP_PATH):
+
+
+def download(zip_path=ZIP_PATH):
+    if os.path.exists(zip_path):
+        print(f"ZIP file already exists at {zip_path}")
+        return
+    import requests
+    os.makedirs(os.path.dirname(zip_path), exist_ok=True)
     print("Downloading GROTOAP2 dataset (this may take a while)...")
     with requests.get(GROTOAP2_URL, stream=True) as r:
         r.raise_for_status()
-        with open(ZIP_PATH, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
+        with open(zip_path + ".part", 'wb') as f:
+            for chunk in r.iter_content(chunk_size=1 << 20):
                 f.write(chunk)
-    print(f"Downloaded to {ZIP_PATH}")
-else:
-    print(f"ZIP file already exists at {ZIP_PATH}")
-
-# Extract GROTOAP2 zip file
-with zipfile.ZipFile(ZIP_PATH, 'r') as zf:
-    zf.extractall(DATA_DIR)
-print("Extracted GROTOAP2 dataset.")
-
-# For demo: process a small subset (e.g., 10 PDFs)
-
-
-def extract_features(text, font_size, is_bold, is_italic, rel_y, length, num_words, x, color):
-    features = {
-        'font_size': font_size,
-        'is_bold': is_bold,
-        'is_italic': is_italic,
-        'rel_y': rel_y,
-        'length': length,
-        'num_words': num_words,
-        'x': x,
-        'color': color,
-        'text_length': len(text),
-        'starts_with_number': int(text[0].isdigit() if text else False),
-        'ends_with_colon': int(text.endswith(':') if text else False),
-        'all_caps': int(text.isupper() if text else False),
-        'title_case': int(text.istitle() if text else False),
-        'has_numbers': int(any(c.isdigit() for c in text) if text else False),
-        'has_special_chars': int(any(c in '()[]{}' for c in text) if text else False),
-        'font_size_large': int(font_size > 14),
-        'font_size_medium': int(10 <= font_size <= 14),
-        'font_size_small': int(font_size < 10),
-        'position_top': int(rel_y < 0.2),
-        'position_middle': int(0.2 <= rel_y <= 0.8),
-        'position_bottom': int(rel_y > 0.8),
-        'short_text': int(length < 20),
-        'medium_text': int(20 <= length <= 50),
-        'long_text': int(length > 50),
-        'single_word': int(num_words == 1),
-        'few_words': int(2 <= num_words <= 5),
-        'many_words': int(num_words > 5)
-    }
-    return features
-
-
-# For demo, process only 10 PDFs
-pdf_files = glob.glob(os.path.join(DATA_DIR, "pdfs", "*.pdf"))[:10]
-annotation_dir = os.path.join(DATA_DIR, "annotations")
-rows = []
-
-for pdf_path in pdf_files:
-    base = os.path.splitext(os.path.basename(pdf_path))[0]
-    ann_path = os.path.join(annotation_dir, base + ".csv")
-    if not os.path.exists(ann_path):
-        continue
-    # Load annotation CSV (columns: page, text, heading_level)
-    ann_df = pd.read_csv(ann_path)
-    doc = fitz.open(pdf_path)
-    for page_num, page in enumerate(doc, 1):
-        blocks = page.get_text("dict")["blocks"]
-        for block in blocks:
-            if block["type"] != 0:
+    os.replace(zip_path + ".part", zip_path)
+    print(f"Downloaded to {zip_path}")
+
+# Helper: pair PDFs with annotation CSVs by file stem, straight from the zip
+# directory (pdfs/<name>.pdf and annotations/<name>.csv at any depth)
+
+
+def list_documents(zf):
+    pdfs, annotations = {}, {}
+    for name in zf.namelist():
+        parts = name.split("/")
+        stem, ext = os.path.splitext(parts[-1])
+        if ext.lower() == ".pdf" and "pdfs" in parts[:-1]:
+            pdfs[stem] = name
+        elif ext.lower() == ".csv" and "annotations" in parts[:-1]:
+            annotations[stem] = name
+    return [(stem, pdfs[stem], annotations[stem])
+            for stem in sorted(pdfs) if stem in annotations]
+
+# Label index: (page, normalized text) -> heading level, first row wins
+
+
+def normalize_text(text):
+    return " ".join(text.split())
+
+
+def annotation_index(fileobj):
+    index = {}
+    reader = csv.DictReader(io.TextIOWrapper(fileobj, encoding="utf-8"))
+    for row in reader:
+        key = (int(row["page"]), normalize_text(row["text"]))
+        index.setdefault(key, row["heading_level"])
+    return index
+
+# Worker: each process keeps its own handle on the zip
+
+
+_zip = None
+
+
+def _init_worker(zip_path):
+    global _zip
+    _zip = zipfile.ZipFile(zip_path)
+
+
+def process_document(stem, pdf_member, ann_member, out_path):
+    with _zip.open(ann_member) as f:
+        index = annotation_index(f)
+    with fitz.open(stream=_zip.read(pdf_member), filetype="pdf") as doc:
+        cols = collect_lines(doc)
+    heading_levels = [
+        index.get((int(page), normalize_text(text)), "not_heading")
+        for text, page in zip(cols['text'], cols['page'])]
+    write_shard(out_path, training_columns(os.path.basename(pdf_member), cols,
+                                           heading_levels))
+    return len(heading_levels)
+
+# Process the corpus in parallel. Finished shards are the checkpoint: a rerun
+# skips documents whose shard exists.
+
+
+def ingest(zip_path=ZIP_PATH, shard_dir=SHARD_DIR, fmt="npz", workers=1,
+           limit=None):
+    with zipfile.ZipFile(zip_path) as zf:
+        documents = list_documents(zf)
+    if limit:
+        documents = documents[:limit]
+    jobs = [(stem, pdf_member, ann_member, shard_path(shard_dir, stem, fmt))
+            for stem, pdf_member, ann_member in documents]
+    todo = [job for job in jobs if not os.path.exists(job[3])]
+    print(f"{len(jobs)} annotated PDFs, {len(jobs) - len(todo)} already "
+          f"processed, {len(todo)} to go")
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(zip_path,)) as pool:
+        futures = {pool.submit(process_document, *job): job for job in todo}
+        for done, future in enumerate(as_completed(futures), 1):
+            stem = futures[future][0]
+            try:
+                rows = future.result()
+            except Exception as exc:
+                failed += 1
+                print(f"[{done}/{len(todo)}] {stem}: failed ({exc})")
                 continue
-            for line in block["lines"]:
-                line_text = " ".join([span["text"]
-                                     for span in line["spans"]]).strip()
-                if not line_text:
-                    continue
-                span = line["spans"][0]
-                font_size = span["size"]
-                is_bold = int("Bold" in span["font"])
-                is_italic = int(
-                    "Italic" in span["font"] or "Oblique" in span["font"])
-                rel_y = line["bbox"][1] / page.rect.height
-                length = len(line_text)
-                num_words = len(line_text.split())
-                x = line["bbox"][0]
-                color = span.get("color", 0)
-                # Label: match annotation by text and page
-                ann = ann_df[(ann_df['page'] == page_num) & (
-                    ann_df['text'].str.strip() == line_text.strip())]
-                heading_level = ann['heading_level'].values[0] if not ann.empty else 'not_heading'
-                feat = extract_features(
-                    line_text, font_size, is_bold, is_italic, rel_y, length, num_words, x, color)
-                row = {
-                    "pdf_file": os.path.basename(pdf_path),
-                    "page": page_num,
-                    "text": line_text,
-                    "font_size": font_size,
-                    "is_bold": is_bold,
-                    "is_italic": is_italic,
-                    "rel_y": rel_y,
-                    "length": length,
-                    "num_words": num_words,
-                    "x": x,
-                    "color": color,
-                    "heading_level": heading_level
-                }
-                row.update(feat)
-                rows.append(row)
-
-pd.DataFrame(rows).to_csv(PROCESSED_CSV, index=False)
-print(f"Saved processed GROTOAP2 data to {PROCESSED_CSV}")
+            if done % 100 == 0 or done == len(todo):
+                print(f"[{done}/{len(todo)}] {stem}: {rows} lines")
+    if failed:
+        print(f"{failed} documents failed; rerun to retry them")
+    return [job[3] for job in jobs if os.path.exists(job[3])]
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Download GROTOAP2 and build heading training shards")
+    parser.add_argument('--zip', default=ZIP_PATH,
+                        help='Dataset archive (default: %(default)s)')
+    parser.add_argument('--shard-dir', default=SHARD_DIR,
+                        help='Per-document shard directory (default: %(default)s)')
+    parser.add_argument('--format', choices=['csv', 'npz', 'parquet'],
+                        default='csv',
+                        help='csv also concatenates the npz shards into '
+                             'PROCESSED_CSV (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes (default: %(default)s)')
+    parser.add_argument('--limit', type=int,
+                        help='Only process the first N documents')
+    args = parser.parse_args()
+    download(args.zip)
+    shard_paths = ingest(args.zip, args.shard_dir,
+                         "npz" if args.format == "csv" else args.format,
+                         args.workers, args.limit)
+    if args.format == "csv":
+        write_csv(shard_paths, PROCESSED_CSV)
@@ -1,51 +1,19 @@
 import os
+import sys
 import glob
 import json
-import fitz  # PyMuPDF
-import pandas as pd
-
-# Feature extraction function (same as in extract_outline.py)
-
-
-def extract_features(text, font_size, is_bold, is_italic, rel_y, length, num_words, x, color):
-    features = {
-        'font_size': font_size,
-        'is_bold': is_bold,
-        'is_italic': is_italic,
-        'rel_y': rel_y,
-        'length': length,
-        'num_words': num_words,
-        'x': x,
-        'color': color,
-        'text_length': len(text),
-        'starts_with_number': int(text[0].isdigit() if text else False),
-        'ends_with_colon': int(text.endswith(':') if text else False),
-        'all_caps': int(text.isupper() if text else False),
-        'title_case': int(text.istitle() if text else False),
-        'has_numbers': int(any(c.isdigit() for c in text) if text else False),
-        'has_special_chars': int(any(c in '()[]{}' for c in text) if text else False),
-        'font_size_large': int(font_size > 14),
-        'font_size_medium': int(10 <= font_size <= 14),
-        'font_size_small': int(font_size < 10),
-        'position_top': int(rel_y < 0.2),
-        'position_middle': int(0.2 <= rel_y <= 0.8),
-        'position_bottom': int(rel_y > 0.8),
-        'short_text': int(length < 20),
-        'medium_text': int(20 <= length <= 50),
-        'long_text': int(length > 50),
-        'single_word': int(num_words == 1),
-        'few_words': int(2 <= num_words <= 5),
-        'many_words': int(num_words > 5)
-    }
-    return features
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pymupdf as fitz  # PyMuPDF
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pdf_features import collect_lines, training_columns  # noqa: E402
+from training_shards import (SHARD_DIR, shard_path, write_csv,  # noqa: E402
+                             write_shard)
 
 INPUT_DIR = "input"
 OUTPUT_DIR = "output"
 TRAIN_CSV = "datasets/final_datasets/custom_train.csv"
 
-os.makedirs(os.path.dirname(TRAIN_CSV), exist_ok=True)
-
 # Helper: load outline from JSON
 
 
@@ -59,59 +27,93 @@ def load_outline(json_path):
         outline[key] = item["level"]
     return outline
 
+# Worker: label one PDF's lines from its JSON outline and write its shard
 
-rows = []
 
-for pdf_path in glob.glob(os.path.join(INPUT_DIR, "*.pdf")):
+def build_shard(pdf_path, json_path, out_path):
     base = os.path.splitext(os.path.basename(pdf_path))[0]
-    json_path = os.path.join(OUTPUT_DIR, base + ".json")
-    if not os.path.exists(json_path):
-        print(f"No JSON outline for {pdf_path}, skipping.")
-        continue
     outline = load_outline(json_path)
-    doc = fitz.open(pdf_path)
-    for page_num, page in enumerate(doc, 1):
-        blocks = page.get_text("dict")["blocks"]
-        for block in blocks:
-            if block["type"] != 0:
-                continue
-            for line in block["lines"]:
-                line_text = " ".join([span["text"]
-                                     for span in line["spans"]]).strip()
-                if not line_text:
-                    continue
-                span = line["spans"][0]
-                font_size = span["size"]
-                is_bold = int("Bold" in span["font"])
-                is_italic = int(
-                    "Italic" in span["font"] or "Oblique" in span["font"])
-                rel_y = line["bbox"][1] / page.rect.height
-                length = len(line_text)
-                num_words = len(line_text.split())
-                x = line["bbox"][0]
-                color = span.get("color", 0)
-                # Label: check if this line is a heading in the outline
-                key = (line_text.strip(), page_num)
-                heading_level = outline.get(key, "not_heading")
-                feat = extract_features(
-                    line_text, font_size, is_bold, is_italic, rel_y, length, num_words, x, color)
-                row = {
-                    "pdf_file": base + ".pdf",
-                    "page": page_num,
-                    "text": line_text,
-                    "font_size": font_size,
-                    "is_bold": is_bold,
-                    "is_italic": is_italic,
-                    "rel_y": rel_y,
-                    "length": length,
-                    "num_words": num_words,
-                    "x": x,
-                    "color": color,
-                    "heading_level": heading_level
-                }
-                row.update(feat)
-                rows.append(row)
-
-# Save to CSV
-pd.DataFrame(rows).to_csv(TRAIN_CSV, index=False)
-print(f"Saved training data to {TRAIN_CSV}")
+    with fitz.open(pdf_path) as doc:
+        cols = collect_lines(doc)
+    # Label: check if each line is a heading in the outline
+    heading_levels = [outline.get((text.strip(), int(page)), "not_heading")
+                      for text, page in zip(cols['text'], cols['page'])]
+    write_shard(out_path, training_columns(base + ".pdf", cols, heading_levels))
+    return len(heading_levels)
+
+# Helper: a shard is current when it is newer than its PDF and outline
+
+
+def shard_is_current(pdf_path, json_path, out_path):
+    if not os.path.exists(out_path):
+        return False
+    return os.path.getmtime(out_path) >= max(os.path.getmtime(pdf_path),
+                                             os.path.getmtime(json_path))
+
+
+def generate(input_dir=INPUT_DIR, labels_dir=OUTPUT_DIR, shard_dir=SHARD_DIR,
+             fmt="npz", workers=1, force=False):
+    jobs = []
+    for pdf_path in glob.glob(os.path.join(input_dir, "*.pdf")):
+        base = os.path.splitext(os.path.basename(pdf_path))[0]
+        json_path = os.path.join(labels_dir, base + ".json")
+        if not os.path.exists(json_path):
+            print(f"No JSON outline for {pdf_path}, skipping.")
+            continue
+        out_path = shard_path(shard_dir, base, fmt)
+        jobs.append((pdf_path, json_path, out_path))
+    todo = [job for job in jobs if force or not shard_is_current(*job)]
+    print(f"{len(jobs)} labeled PDFs, {len(jobs) - len(todo)} already "
+          f"processed, {len(todo)} to go")
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(build_shard, *job): job for job in todo}
+            for done, future in enumerate(as_completed(futures), 1):
+                rows = future.result()
+                print(f"[{done}/{len(todo)}] {futures[future][0]}: {rows} lines")
+    else:
+        for done, job in enumerate(todo, 1):
+            rows = build_shard(*job)
+            print(f"[{done}/{len(todo)}] {job[0]}: {rows} lines")
+    return [out_path for _, _, out_path in jobs]
+
+def main(input_dir=INPUT_DIR, labels_dir=OUTPUT_DIR, shard_dir=SHARD_DIR,
+         fmt="csv", workers=1, force=False, csv_path=TRAIN_CSV):
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            sys.exit("--format parquet needs pyarrow (pip install pyarrow)")
+    shard_paths = generate(input_dir, labels_dir, shard_dir,
+                           "npz" if fmt == "csv" else fmt, workers, force)
+    if fmt == "csv":
+        write_csv(shard_paths, csv_path)
+    else:
+        print(f"Saved {len(shard_paths)} {fmt} shards to {shard_dir}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Build heading training data from PDFs and JSON outlines")
+    parser.add_argument('--input-dir', default=INPUT_DIR,
+                        help='PDFs to label (default: %(default)s)')
+    parser.add_argument('--labels-dir', default=OUTPUT_DIR,
+                        help='JSON outlines named like the PDFs '
+                             '(default: %(default)s)')
+    parser.add_argument('--format', choices=['csv', 'npz', 'parquet'],
+                        default='csv',
+                        help='csv writes one CSV (via npz shards); npz and '
+                             'parquet keep one columnar shard per PDF '
+                             '(default: %(default)s)')
+    parser.add_argument('--shard-dir', default=SHARD_DIR,
+                        help='Per-PDF shard directory (default: %(default)s)')
+    parser.add_argument('--csv', default=TRAIN_CSV,
+                        help='Output CSV for --format csv (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Worker processes (default: %(default)s)')
+    parser.add_argument('--force', action='store_true',
+                        help='Rebuild shards that are already up to date')
+    args = parser.parse_args()
+    main(args.input_dir, args.labels_dir, args.shard_dir, args.format,
+         args.workers, args.force, args.csv)
@@ -0,0 +1,233 @@
+import io
+import os
+import sys
+import json
+import time
+import pickle
+import itertools
+import tempfile
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import precision_recall_fscore_support
+from sklearn.model_selection import GroupKFold
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compact_forest import CompactForest, export_forest  # noqa: E402
+from pdf_features import FEATURE_COLUMNS, LINE_COLUMNS  # noqa: E402
+from training_shards import feature_matrix_from_table, load_shards  # noqa: E402
+
+TRAIN_PATH = "datasets/final_datasets/custom_train.csv"
+LEVELS = ["H1", "H2", "H3"]
+# Default grid; 0 means unlimited for max_depth and max_leaf_nodes
+N_ESTIMATORS = [10, 25, 50, 100]
+MAX_DEPTH = [0, 8, 12, 16]
+MAX_LEAF_NODES = [0, 64, 256]
+# Feature subsets: everything, the raw line columns only, and the raw columns
+# plus text flags (i.e. without the binned size/position/length flags, which
+# a tree can rebuild from the raw values)
+FEATURE_SETS = {
+    "all": FEATURE_COLUMNS,
+    "line": LINE_COLUMNS,
+    "text": FEATURE_COLUMNS[:FEATURE_COLUMNS.index('font_size_large')],
+}
+
+# Helper: training data as (X, label strings, pdf_file groups)
+
+
+def load_training_data(csv_path=TRAIN_PATH, shard_dir=None):
+    if shard_dir:
+        table = load_shards(shard_dir)
+        X = feature_matrix_from_table(table)
+        labels = np.asarray(table['heading_level']).astype(str)
+        groups = np.asarray(table['pdf_file']).astype(str)
+    else:
+        df = pd.read_csv(csv_path)
+        X = df[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+        labels = df['heading_level'].astype(str).to_numpy()
+        groups = df['pdf_file'].astype(str).to_numpy()
+    return X, labels, groups
+
+# Worker: the data is shipped once per process, then configs are evaluated
+
+
+_data = None
+
+
+def _init_worker(X, y, groups, label_map, folds):
+    global _data
+    _data = (X, y, groups, label_map, folds)
+
+
+def make_forest(config, random_state=42):
+    return RandomForestClassifier(
+        n_estimators=config["n_estimators"],
+        max_depth=config["max_depth"] or None,
+        max_leaf_nodes=config["max_leaf_nodes"] or None,
+        class_weight='balanced', random_state=random_state, n_jobs=1)
+
+
+def evaluate(config):
+    # Out-of-fold predictions with whole documents held out, then a final
+    # fit on all data exported to the compact form. Returns the record and
+    # the .npz bytes; the parent times those serially so parallel workers do
+    # not skew latency.
+    X, y, groups, label_map, folds = _data
+    columns = [FEATURE_COLUMNS.index(name)
+               for name in FEATURE_SETS[config["features"]]]
+    X = np.ascontiguousarray(X[:, columns])
+    inv_label_map = {i: label for label, i in label_map.items()}
+    oof = np.empty(len(y), dtype=y.dtype)
+    fit_seconds = 0.0
+    for train, test in GroupKFold(n_splits=folds).split(X, y, groups):
+        start = time.perf_counter()
+        clf = make_forest(config).fit(X[train], y[train])
+        fit_seconds += time.perf_counter() - start
+        oof[test] = clf.predict(X[test])
+    level_ids = [label_map[level] for level in LEVELS if level in label_map]
+    precision, recall, f1, support = precision_recall_fscore_support(
+        y, oof, labels=level_ids, zero_division=0)
+    scores = {inv_label_map[i]: {"precision": float(p), "recall": float(r),
+                                 "f1": float(f), "support": int(s)}
+              for i, p, r, f, s in zip(level_ids, precision, recall, f1,
+                                       support)}
+    clf = make_forest(config).fit(X, y)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.npz")
+        with contextlib.redirect_stdout(io.StringIO()):
+            export_forest(clf, inv_label_map, path)
+        with open(path, "rb") as f:
+            compact = f.read()
+    return {
+        **config,
+        "folds": folds,
+        "scores": scores,
+        "macro_f1": float(np.mean([s["f1"] for s in scores.values()])),
+        "accuracy": float(np.mean(oof == y)),
+        "fit_seconds": fit_seconds / folds,
+        "nodes": int(sum(e.tree_.node_count for e in clf.estimators_)),
+        "pickle_bytes": len(pickle.dumps(clf)),
+        "model_bytes": len(compact),
+    }, compact
+
+
+def time_compact(record, compact, X, repeats=3):
+    columns = [FEATURE_COLUMNS.index(name)
+               for name in FEATURE_SETS[record["features"]]]
+    X = np.ascontiguousarray(X[:, columns])
+    load_seconds = predict_seconds = float("inf")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.npz")
+        with open(path, "wb") as f:
+            f.write(compact)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            model = CompactForest.load(path)
+            load_seconds = min(load_seconds, time.perf_counter() - start)
+            start = time.perf_counter()
+            model.predict(X)
+            predict_seconds = min(predict_seconds, time.perf_counter() - start)
+    record.update(load_seconds=load_seconds,
+                  predict_lines_per_second=len(X) / predict_seconds,
+                  predict_us_per_line=predict_seconds / len(X) * 1e6)
+    return record
+
+# Pareto frontier: configs no other config beats on every objective
+# (higher macro F1, fewer model bytes, less predict time per line)
+
+
+def pareto_frontier(records):
+    def dominates(a, b):
+        better_or_equal = (a["macro_f1"] >= b["macro_f1"] and
+                           a["model_bytes"] <= b["model_bytes"] and
+                           a["predict_us_per_line"] <= b["predict_us_per_line"])
+        strictly = (a["macro_f1"] > b["macro_f1"] or
+                    a["model_bytes"] < b["model_bytes"] or
+                    a["predict_us_per_line"] < b["predict_us_per_line"])
+        return better_or_equal and strictly
+    return [r for r in records
+            if not any(dominates(other, r) for other in records)]
+
+
+def main(csv_path=TRAIN_PATH, shard_dir=None, n_estimators=N_ESTIMATORS,
+         max_depth=MAX_DEPTH, max_leaf_nodes=MAX_LEAF_NODES,
+         feature_sets=tuple(FEATURE_SETS), folds=5, workers=os.cpu_count() or 1,
+         out=None):
+    X, labels, groups = load_training_data(csv_path, shard_dir)
+    label_map = {l: i for i, l in enumerate(sorted(set(labels)))}
+    y = np.asarray([label_map[label] for label in labels])
+    folds = min(folds, len(set(groups)))
+    if folds < 2:
+        print("Need at least two documents for held-out evaluation")
+        return []
+    configs = [{"n_estimators": n, "max_depth": d, "max_leaf_nodes": leaves,
+                "features": features}
+               for n, d, leaves, features in itertools.product(
+                   n_estimators, max_depth, max_leaf_nodes, feature_sets)]
+    print(f"{len(configs)} configs, {len(y)} lines from {len(set(groups))} "
+          f"documents, {folds}-fold grouped by pdf_file, {workers} workers")
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(X, y, groups, label_map, folds)) as pool:
+        futures = [pool.submit(evaluate, config) for config in configs]
+        for done, future in enumerate(as_completed(futures), 1):
+            results.append(future.result())
+            if done % 10 == 0 or done == len(configs):
+                print(f"[{done}/{len(configs)}]")
+    # Latency is measured once the pool is idle
+    records = [time_compact(record, compact, X) for record, compact in results]
+    frontier = pareto_frontier(records)
+    for record in records:
+        record["pareto"] = record in frontier
+    sink = open(out, "w", encoding="utf-8") if out else sys.stdout
+    for record in records:
+        print(json.dumps(record), file=sink)
+    if out:
+        sink.close()
+        print(f"Results saved to {out}")
+    print("\nPareto frontier (macro F1 up, model bytes down, predict time "
+          "down):", file=sys.stderr)
+    print(f"{'trees':>5} {'depth':>5} {'leaves':>6} {'features':<8} "
+          f"{'macroF1':>7} " + " ".join(f"{'F1 ' + l:>6}" for l in LEVELS) +
+          f" {'KiB':>8} {'load ms':>8} {'us/line':>8}", file=sys.stderr)
+    for r in sorted(frontier, key=lambda r: -r["macro_f1"]):
+        print(f"{r['n_estimators']:>5} {r['max_depth'] or '-':>5} "
+              f"{r['max_leaf_nodes'] or '-':>6} {r['features']:<8} "
+              f"{r['macro_f1']:>7.3f} " +
+              " ".join(f"{r['scores'].get(l, {}).get('f1', 0.0):>6.3f}"
+                       for l in LEVELS) +
+              f" {r['model_bytes'] / 1024:>8.1f} {r['load_seconds'] * 1000:>8.2f}"
+              f" {r['predict_us_per_line']:>8.2f}", file=sys.stderr)
+    return records
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Sweep RandomForest sizes with held-out evaluation and "
+                    "report the accuracy/size/latency Pareto frontier")
+    parser.add_argument('--csv', default=TRAIN_PATH,
+                        help='Training CSV (default: %(default)s)')
+    parser.add_argument('--shard-dir',
+                        help='Use the npz shards in this directory instead')
+    parser.add_argument('--n-estimators', type=int, nargs='+',
+                        default=N_ESTIMATORS)
+    parser.add_argument('--max-depth', type=int, nargs='+', default=MAX_DEPTH,
+                        help='0 means unlimited (default: %(default)s)')
+    parser.add_argument('--max-leaf-nodes', type=int, nargs='+',
+                        default=MAX_LEAF_NODES,
+                        help='0 means unlimited (default: %(default)s)')
+    parser.add_argument('--feature-sets', nargs='+', choices=list(FEATURE_SETS),
+                        default=list(FEATURE_SETS))
+    parser.add_argument('--folds', type=int, default=5,
+                        help='Grouped folds, at most one per document '
+                             '(default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--out', help='Write one JSON record per config here '
+                                      '(default: stdout)')
+    args = parser.parse_args()
+    main(args.csv, args.shard_dir, args.n_estimators, args.max_depth,
+         args.max_leaf_nodes, args.feature_sets, args.folds, args.workers,
+         args.out)
@@ -1,44 +1,78 @@
-import pandas as pd
-import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import classification_report
-import pickle
 import os
+import sys
+from sklearn.metrics import classification_report
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from compact_forest import MODEL_DIR, MODEL_PATH  # noqa: E402
+from outline_cache import file_digest  # noqa: E402
+from training_shards import (feature_matrix_from_table, read_shard,  # noqa: E402
+                             shard_files)
+from training_store import (ADD_TREES, MAX_TREES, REPLAY_PER_CLASS,  # noqa: E402
+                            STORE_DIR, TrainingStore, import_csv,
+                            retrain_forest)
+
+TRAIN_PATH = os.path.join(MODEL_DIR, "custom_train.csv")
+
+# Import every shard as its own store batch; unchanged shards are skipped
+
+
+def import_shards(store, shard_dir):
+    added = 0
+    for path in shard_files(shard_dir):
+        def load(path=path):
+            table = read_shard(path)
+            return (feature_matrix_from_table(table),
+                    [str(level) for level in table['heading_level']])
+        if store.import_table(os.path.normpath(path), file_digest(path), load):
+            added += 1
+    print(f"Imported {added} new or changed shards from {shard_dir}")
+
+
+def main(csv_path=TRAIN_PATH, shard_dir=None, store_dir=STORE_DIR, full=False,
+         add_trees=ADD_TREES, max_trees=MAX_TREES,
+         replay_per_class=REPLAY_PER_CLASS):
+    store = TrainingStore(store_dir)
+    if shard_dir:
+        import_shards(store, shard_dir)
+    else:
+        import_csv(store, csv_path)
+    clf, label_map, inv_label_map, mode = retrain_forest(
+        store, MODEL_PATH, full=full, add_trees=add_trees,
+        max_trees=max_trees, replay_per_class=replay_per_class)
+    if mode == "unchanged":
+        return
+    # Print training report
+    X, y = store.arrays()
+    preds = clf.predict(X)
+    print(classification_report(y, preds, labels=sorted(inv_label_map),
+                                target_names=[inv_label_map[i] for i in
+                                              sorted(inv_label_map)],
+                                zero_division=0))
+
 
-TRAIN_PATH = "datasets/final_datasets/custom_train.csv"
-MODEL_PATH = "datasets/final_datasets/rf_headings_model_custom.pkl"
-
-# Load data
-train_df = pd.read_csv(TRAIN_PATH)
-
-# Features to use (same as in extract_features)
-feature_cols = [
-    'font_size', 'is_bold', 'is_italic', 'rel_y', 'length', 'num_words', 'x', 'color',
-    'text_length', 'starts_with_number', 'ends_with_colon', 'all_caps', 'title_case',
-    'has_numbers', 'has_special_chars', 'font_size_large', 'font_size_medium',
-    'font_size_small', 'position_top', 'position_middle', 'position_bottom',
-    'short_text', 'medium_text', 'long_text', 'single_word', 'few_words', 'many_words'
-]
-
-X = train_df[feature_cols].values
-# Encode labels
-labels = train_df['heading_level'].astype(str)
-label_map = {l: i for i, l in enumerate(sorted(labels.unique()))}
-inv_label_map = {i: l for l, i in label_map.items()}
-y = labels.map(label_map).values
-
-# Train/test split (optional, here we use all for training)
-clf = RandomForestClassifier(
-    n_estimators=100, random_state=42, class_weight='balanced')
-clf.fit(X, y)
-
-# Save model and label map
-with open(MODEL_PATH, 'wb') as f:
-    pickle.dump({'model': clf, 'label_map': label_map,
-                'inv_label_map': inv_label_map}, f)
-print(f"Model saved to {MODEL_PATH}")
-
-# Print training report
-preds = clf.predict(X)
-print(classification_report(y, preds, target_names=[
-      inv_label_map[i] for i in range(len(inv_label_map))]))
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Train the RandomForest from the incremental training store")
+    parser.add_argument('--csv', default=TRAIN_PATH,
+                        help='Training CSV to import (default: %(default)s)')
+    parser.add_argument('--shard-dir',
+                        help='Import the npz shards in this directory instead '
+                             'of the CSV, one store batch per shard')
+    parser.add_argument('--store', default=STORE_DIR,
+                        help='Training store directory (default: %(default)s)')
+    parser.add_argument('--full', action='store_true',
+                        help='Rebuild the forest from scratch')
+    parser.add_argument('--add-trees', type=int, default=ADD_TREES,
+                        help='Trees added per incremental update '
+                             '(default: %(default)s)')
+    parser.add_argument('--max-trees', type=int, default=MAX_TREES,
+                        help='Rebuild once the forest would grow past this '
+                             '(default: %(default)s)')
+    parser.add_argument('--replay-per-class', type=int,
+                        default=REPLAY_PER_CLASS,
+                        help='Old rows per class mixed into an incremental '
+                             'update (default: %(default)s)')
+    args = parser.parse_args()
+    main(args.csv, args.shard_dir, args.store, args.full, args.add_trees,
+         args.max_trees, args.replay_per_class)
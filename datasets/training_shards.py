@@ -0,0 +1,82 @@
+import os
+import sys
+import glob
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from atomic_files import atomic_path  # noqa: E402
+from pdf_features import FEATURE_COLUMNS, TRAINING_COLUMNS  # noqa: E402
+
+SHARD_DIR = "datasets/final_datasets/shards"
+FORMATS = ("npz", "parquet")
+
+# Columnar training shards: one file per source PDF holding every column of
+# TRAINING_COLUMNS as its own array. Shards are written to a temp file and
+# renamed, so an interrupted run never leaves a partial shard behind.
+
+
+def shard_path(shard_dir, name, fmt="npz"):
+    return os.path.join(shard_dir, f"{name}.{fmt}")
+
+
+def write_shard(path, table):
+    fmt = os.path.splitext(path)[1].lstrip(".")
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    with atomic_path(path) as tmp_path:
+        if fmt == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            pq.write_table(pa.table({name: np.asarray(values)
+                                     for name, values in table.items()}),
+                           tmp_path)
+        else:
+            with open(tmp_path, "wb") as f:
+                np.savez(f, **{name: np.asarray(values)
+                               for name, values in table.items()})
+
+
+def read_shard(path):
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        table = pq.read_table(path)
+        return {name: table.column(name).to_numpy(zero_copy_only=False)
+                for name in table.column_names}
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+# Helper: every shard in a directory as one table, plus the model inputs
+
+
+def shard_files(shard_dir, fmt="npz"):
+    return sorted(glob.glob(os.path.join(shard_dir, f"*.{fmt}")))
+
+
+def load_shards(shard_dir, fmt="npz"):
+    tables = [read_shard(path) for path in shard_files(shard_dir, fmt)]
+    tables = [t for t in tables if len(t.get("heading_level", ()))]
+    if not tables:
+        return {name: np.array([]) for name in TRAINING_COLUMNS}
+    return {name: np.concatenate([t[name] for t in tables])
+            for name in TRAINING_COLUMNS}
+
+
+def feature_matrix_from_table(table):
+    X = np.empty((len(table["heading_level"]), len(FEATURE_COLUMNS)),
+                 dtype=np.float32)
+    for i, name in enumerate(FEATURE_COLUMNS):
+        X[:, i] = table[name]
+    return X
+
+# Helper: concatenate shards (in the given order) into one CSV
+
+
+def write_csv(shard_paths, csv_path):
+    import pandas as pd
+    frames = [pd.DataFrame(read_shard(path)) for path in shard_paths]
+    frames = [frame[TRAINING_COLUMNS] for frame in frames if len(frame)]
+    df = (pd.concat(frames, ignore_index=True) if frames
+          else pd.DataFrame(columns=TRAINING_COLUMNS))
+    os.makedirs(os.path.dirname(csv_path) or ".", exist_ok=True)
+    df.to_csv(csv_path, index=False)
+    print(f"Saved {len(df)} rows to {csv_path}")
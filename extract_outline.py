@@ -1,180 +1,1129 @@
 import os
+import sys
 import glob
-import json
-import fitz  # PyMuPDF
+import mmap
+import time
+import contextlib
+import functools
+import collections
+from concurrent.futures import ProcessPoolExecutor
+import pymupdf as fitz  # PyMuPDF
 import numpy as np
-import pandas as pd
 import pickle
-from sklearn.ensemble import RandomForestClassifier
+from atomic_files import atomic_write_json
+from compact_forest import (COMPACT_MODEL_PATH, MODEL_DIR, MODEL_PATH,
+                            CompactForest, mapped_model)
+from crf_model import CRF_MODEL_PATH, CrfModel
+from outline_metrics import DocMetrics, MetricsRecorder
+from outline_cache import (CACHE_MAX_BYTES, OutlineCache, file_digest,
+                           page_digest)
+from outline_leases import (LEASE_POLL_SECONDS, LEASE_SECONDS,
+                            MANIFEST_SECONDS, LeaseDir, leased_paths)
+from outline_toc import toc_outline
+from outline_stream import (NDJSON_MAX_BYTES, POLL_SECONDS, NdjsonWriter,
+                            stdin_paths, watch_paths)
+from pdf_features import (FEATURE_COLUMNS, LINE_COLUMNS, candidate_mask,
+                          collect_lines,
+                          concat_columns, feature_matrix, font_profile,
+                          iter_page_lines, line_columns, repeated_line_mask,
+                          rule_heading_levels, select_rows)
+from training_store import STORE_DIR, TrainingStore, import_csv, retrain_forest
 
-MODEL_PATH = os.path.join("datasets", "final_datasets",
-                          "rf_headings_model_custom.pkl")
-TRAIN_CSV = os.path.join("datasets", "final_datasets", "custom_train.csv")
+TRAIN_CSV = os.path.join(MODEL_DIR, "custom_train.csv")
 INPUT_DIR = "input"
 OUTPUT_DIR = "output"
+# PDFs with more pages than this are split into page ranges in --workers mode
+SHARD_PAGES = 50
+# Documents submitted ahead of the one being merged, per --workers process
+DOCS_IN_FLIGHT_PER_WORKER = 2
+# With --prune, body-size non-bold lines longer than this skip the model
+PRUNE_WORDS = 5
+# --page-window mode: pages parsed at a time and lines per predict call
+PAGE_WINDOW = 16
+BATCH_LINES = 2048
+# --deadline-ms mode: share of the budget spent extracting pages, the
+# extraction cost per content-stream byte assumed until a page has been
+# timed (pessimistic; measured pages run at 0.2-0.7 us/byte), the cost of
+# merely reading each of a page's content streams, lines classified by the
+# full model to time it, and the smallest forest used before falling back
+# to the rule-based pass
+DEADLINE_EXTRACT_SHARE = 0.6
+DEADLINE_BYTE_SECONDS = 1e-6
+DEADLINE_STREAM_SECONDS = 10e-6
+DEADLINE_PROBE_LINES = 256
+DEADLINE_MIN_TREES = 5
 
-# Feature extraction function (same as in training)
-
-
-def extract_features(text, font_size, is_bold, is_italic, rel_y, length, num_words, x, color):
-    features = [
-        font_size,
-        is_bold,
-        is_italic,
-        rel_y,
-        length,
-        num_words,
-        x,
-        color,
-        len(text),
-        int(text[0].isdigit() if text else False),
-        int(text.endswith(":") if text else False),
-        int(text.isupper() if text else False),
-        int(text.istitle() if text else False),
-        int(any(c.isdigit() for c in text) if text else False),
-        int(any(c in '()[]{}' for c in text) if text else False),
-        int(font_size > 14),
-        int(10 <= font_size <= 14),
-        int(font_size < 10),
-        int(rel_y < 0.2),
-        int(0.2 <= rel_y <= 0.8),
-        int(rel_y > 0.8),
-        int(length < 20),
-        int(20 <= length <= 50),
-        int(length > 50),
-        int(num_words == 1),
-        int(2 <= num_words <= 5),
-        int(num_words > 5)
-    ]
-    return features
-
-# If model is missing, retrain automatically
-
-
-def train_rf_model():
+# If model is missing, retrain automatically. The CSV is imported into the
+# training store (skipped when unchanged) and the forest is rebuilt or
+# extended with new trees, see training_store.retrain_forest. pandas and
+# sklearn are only needed here, so the normal inference path never imports
+# them.
+
+
+def train_rf_model(full=False):
     print("Training RandomForest model from CSV...")
-    train_df = pd.read_csv(TRAIN_CSV)
-    feature_cols = [
-        'font_size', 'is_bold', 'is_italic', 'rel_y', 'length', 'num_words', 'x', 'color',
-        'text_length', 'starts_with_number', 'ends_with_colon', 'all_caps', 'title_case',
-        'has_numbers', 'has_special_chars', 'font_size_large', 'font_size_medium',
-        'font_size_small', 'position_top', 'position_middle', 'position_bottom',
-        'short_text', 'medium_text', 'long_text', 'single_word', 'few_words', 'many_words'
-    ]
-    X = train_df[feature_cols].values
-    labels = train_df['heading_level'].astype(str)
-    label_map = {l: i for i, l in enumerate(sorted(labels.unique()))}
-    inv_label_map = {i: l for l, i in label_map.items()}
-    y = labels.map(label_map).values
-    clf = RandomForestClassifier(
-        n_estimators=100, random_state=42, class_weight='balanced')
-    clf.fit(X, y)
-    with open(MODEL_PATH, 'wb') as f:
-        pickle.dump({'model': clf, 'label_map': label_map,
-                    'inv_label_map': inv_label_map}, f)
-    print(f"Model trained and saved to {MODEL_PATH}")
+    store = TrainingStore(STORE_DIR)
+    import_csv(store, TRAIN_CSV)
+    clf, label_map, inv_label_map, _ = retrain_forest(
+        store, MODEL_PATH, COMPACT_MODEL_PATH, full=full)
     return clf, label_map, inv_label_map
 
-# Load or train model
+# Load or train model. The compact .npz export is preferred; it is only used
+# when it was exported from the current pickle, otherwise sklearn is loaded.
+
+
+def load_compact_model():
+    if not os.path.exists(COMPACT_MODEL_PATH):
+        return None
+    model = CompactForest.load(COMPACT_MODEL_PATH)
+    if (os.path.exists(MODEL_PATH) and
+            model.source_digest != file_digest(MODEL_PATH)):
+        print(f"{COMPACT_MODEL_PATH} is stale, loading {MODEL_PATH}")
+        return None
+    return model
 
 
-def load_rf_model(force_retrain=False):
-    if force_retrain or not os.path.exists(MODEL_PATH):
+def load_rf_model(force_retrain=False, compact=True):
+    if force_retrain or not (os.path.exists(MODEL_PATH) or
+                             os.path.exists(COMPACT_MODEL_PATH)):
         return train_rf_model()
+    model = load_compact_model() if compact else None
+    if model is not None:
+        return (model, *model.label_maps())
     with open(MODEL_PATH, 'rb') as f:
         data = pickle.load(f)
     return data['model'], data['label_map'], data['inv_label_map']
 
+
+def load_model(kind="rf", force_retrain=False):
+    # kind is "rf" (RandomForest) or "crf" (per-page sequence CRF)
+    if kind == "crf":
+        model = CrfModel.load(CRF_MODEL_PATH)
+        return (model, *model.label_maps())
+    return load_rf_model(force_retrain=force_retrain)
+
+
+def model_kind(model):
+    return "crf" if isinstance(model, CrfModel) else "rf"
+
+
+def model_fingerprint(model):
+    if isinstance(model, CrfModel):
+        return file_digest(CRF_MODEL_PATH)
+    if isinstance(model, CompactForest):
+        return file_digest(COMPACT_MODEL_PATH)
+    return file_digest(MODEL_PATH)
+
 # Helper: extract lines and features from PDF
 
 
-def extract_pdf_lines_and_features(pdf_path):
-    doc = fitz.open(pdf_path)
-    lines = []
-    features = []
-    for page_num, page in enumerate(doc, 1):
-        blocks = page.get_text("dict")["blocks"]
-        for block in blocks:
-            if block["type"] != 0:
-                continue  # skip images, etc.
-            for line in block["lines"]:
-                line_text = " ".join([span["text"]
-                                     for span in line["spans"]]).strip()
-                if not line_text:
-                    continue
-                span = line["spans"][0]
-                font_size = span["size"]
-                is_bold = int("Bold" in span["font"])
-                is_italic = int(
-                    "Italic" in span["font"] or "Oblique" in span["font"])
-                rel_y = line["bbox"][1] / page.rect.height
-                length = len(line_text)
-                num_words = len(line_text.split())
-                x = line["bbox"][0]
-                color = span.get("color", 0)
-                feat = extract_features(
-                    line_text, font_size, is_bold, is_italic, rel_y, length, num_words, x, color
-                )
-                lines.append({
-                    "text": line_text,
-                    "page": page_num,
-                })
-                features.append(feat)
-    return lines, features
+def open_pdf(source):
+    # `source` is a path, the PDF's bytes (bytes, bytearray, memoryview or
+    # mmap) or a binary file object
+    if isinstance(source, mmap.mmap):
+        source = memoryview(source)
+    elif hasattr(source, "read"):
+        source = source.read()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source)
+
+
+def extract_pdf_columns(pdf_path, page_range=None, metrics=None):
+    metrics = metrics or DocMetrics()
+    with metrics.stage("open"):
+        doc = open_pdf(pdf_path)
+    with doc:
+        with metrics.stage("extract"):
+            cols = collect_lines(doc, page_range)
+        metrics.count("pages", page_range[1] - page_range[0] if page_range
+                      else doc.page_count)
+    metrics.count("lines", len(cols['text']))
+    return cols
+
+
+def line_records(cols):
+    return [{"text": text, "page": int(page)}
+            for text, page in zip(cols['text'], cols['page'])]
+
+
+def extract_pdf_lines_and_features(pdf_path, page_range=None):
+    cols = extract_pdf_columns(pdf_path, page_range)
+    return line_records(cols), feature_matrix(cols)
+
+# Helper: predict class indices for a feature matrix. The CRF labels each
+# page's lines as one sequence, so it also gets the keys that group lines into
+# sequences (page numbers, plus document ids when documents are batched).
+
+
+def predict_lines(model, X, *keys):
+    if isinstance(model, CrfModel):
+        return model.predict(X, *keys)
+    return model.predict(X)
+
+# Helper: classify lines. With prune_words set, a font-profile prepass labels
+# plain body text as not_heading without building features for it; with
+# drop_repeated, so are running headers, footers and page numbers found by
+# the document-level repeated_line_mask index.
+
+
+def candidate_features(cols, prune_words=None, drop_repeated=False):
+    # (mask of lines sent to the model, their features, their page numbers,
+    # number of repeated lines dropped)
+    n = len(cols['text'])
+    mask = np.ones(n, dtype=bool)
+    repeated = 0
+    if drop_repeated:
+        boilerplate = repeated_line_mask(cols)
+        repeated = int(boilerplate.sum())
+        mask &= ~boilerplate
+    if prune_words is not None:
+        mask &= candidate_mask(cols, font_profile(cols), prune_words)
+    candidates = select_rows(cols, mask)
+    if mask.any():
+        X = feature_matrix(candidates)
+    else:
+        X = np.empty((0, len(FEATURE_COLUMNS)), dtype=np.float32)
+    return mask, X, np.asarray(candidates['page']), repeated
+
+
+def classify_columns(model, label_map, cols, prune_words=None, metrics=None,
+                     drop_repeated=False):
+    metrics = metrics or DocMetrics()
+    start = time.perf_counter()
+    n = len(cols['text'])
+    with metrics.stage("features"):
+        mask, X, pages, repeated = candidate_features(cols, prune_words,
+                                                      drop_repeated)
+    preds = np.full(n, label_map['not_heading'])
+    if len(X):
+        with metrics.stage("predict"):
+            preds[mask] = predict_lines(model, X, pages)
+    elapsed = time.perf_counter() - start
+    stats = {"lines": n, "classify_seconds": elapsed}
+    if drop_repeated:
+        stats["repeated"] = repeated
+        metrics.count("repeated", repeated)
+    if prune_words is not None or drop_repeated:
+        kept = int(mask.sum())
+        if prune_words is not None:
+            stats["pruned"] = n - kept - repeated
+        # Estimated from the per-line cost of the lines that were classified
+        stats["saved_seconds"] = elapsed / kept * (n - kept) if kept else 0.0
+    return line_records(cols), preds, stats
+
+
+def merge_stats(total, stats):
+    for key, value in stats.items():
+        total[key] = total.get(key, 0) + value
+    return total
+
+
+def report_pruning(stats, prefix=""):
+    if not stats.get("lines") or "saved_seconds" not in stats:
+        return
+    saved = f"~{stats['saved_seconds'] * 1000:.1f} ms saved"
+    if "repeated" in stats:
+        print(f"{prefix}Dropped {stats['repeated']}/{stats['lines']} repeated "
+              f"header/footer lines ({stats['repeated'] / stats['lines']:.1%})"
+              + ("" if "pruned" in stats else f", {saved}"))
+    if "pruned" in stats:
+        print(f"{prefix}Pruned {stats['pruned']}/{stats['lines']} lines "
+              f"({stats['pruned'] / stats['lines']:.1%}) before "
+              f"classification, {saved}")
 
 # Helper: build outline from predictions
 
 
-def build_outline(lines, preds, inv_label_map):
-    outline = []
-    title = None
+def iter_headings(lines, preds, inv_label_map):
     for line, pred in zip(lines, preds):
         label = inv_label_map[pred]
         if label == "not_heading":
             continue
-        if label == "H1" and not title:
-            title = line["text"]
-        outline.append({
+        yield {
             "level": label,
             "text": line["text"],
             "page": line["page"]
-        })
+        }
+
+
+def collect_outline(headings):
+    outline = []
+    title = None
+    for heading in headings:
+        if heading["level"] == "H1" and not title:
+            title = heading["text"]
+        outline.append(heading)
     if not title and outline:
         title = outline[0]["text"]
     return title, outline
 
-# Main processing loop
 
+def build_outline(lines, preds, inv_label_map):
+    return collect_outline(iter_headings(lines, preds, inv_label_map))
+
+# Page streaming: parse `window_pages` pages at a time and classify them in
+# batches of at most `batch_lines` lines, so memory stays bounded by the
+# window rather than the document. Batches end on page boundaries (a page
+# longer than `batch_lines` is one batch), since the CRF labels a page as one
+# sequence. Headings are yielded in document order.
+
+
+def iter_line_batches(pdf_path, window_pages=PAGE_WINDOW,
+                      batch_lines=BATCH_LINES, metrics=None):
+    metrics = metrics or DocMetrics()
+    with metrics.stage("open"):
+        doc = open_pdf(pdf_path)
+    with doc:
+        metrics.count("pages", doc.page_count)
+        for start in range(0, doc.page_count, window_pages):
+            with metrics.stage("extract"):
+                page_records = [
+                    list(iter_page_lines(doc.load_page(page_index),
+                                         page_index + 1))
+                    for page_index in range(start, min(start + window_pages,
+                                                       doc.page_count))]
+            metrics.count("lines", sum(map(len, page_records)))
+            records = []
+            for page in page_records:
+                if records and len(records) + len(page) > batch_lines:
+                    yield line_columns(records)
+                    records = []
+                records.extend(page)
+            if records:
+                yield line_columns(records)
+
+
+def iter_outline_entries(pdf_path, model, inv_label_map,
+                         window_pages=PAGE_WINDOW, batch_lines=BATCH_LINES,
+                         stats=None, metrics=None):
+    metrics = metrics or DocMetrics()
+    for cols in iter_line_batches(pdf_path, window_pages, batch_lines,
+                                  metrics):
+        with metrics.stage("features"):
+            X = feature_matrix(cols)
+        with metrics.stage("predict"):
+            preds = predict_lines(model, X, cols['page'])
+        if stats is not None:
+            stats["lines"] = stats.get("lines", 0) + len(preds)
+        yield from iter_headings(line_records(cols), preds, inv_label_map)
+
+
+def stream_outline(pdf_path, model, inv_label_map, window_pages=PAGE_WINDOW,
+                   batch_lines=BATCH_LINES, metrics=None):
+    stats = {}
+    title, outline = collect_outline(iter_outline_entries(
+        pdf_path, model, inv_label_map, window_pages, batch_lines, stats,
+        metrics))
+    if not stats.get("lines"):
+        return None, stats
+    return {"title": title if title else "", "outline": outline}, stats
+
+# Deadline mode: every document gets a time budget and always yields a valid
+# {title, outline, truncated}. Pages are extracted in order while the
+# extraction share of the budget lasts; a page whose predicted cost (its
+# content stream size times the rate seen so far, or DEADLINE_BYTE_SECONDS
+# before any page is done; pages with too many streams to even read in time
+# are skipped unread) does not fit is skipped, and skipped pages make
+# the result truncated. The lines extracted are then
+# classified with the best strategy that fits the time left: the full model,
+# a CompactForest cut to fewer trees, or the rule-based pass.
+
+
+def content_streams(doc, page):
+    # Number of content streams, from the page's /Contents entry alone
+    kind, value = doc.xref_get_key(page.xref, "Contents")
+    if kind == "array":
+        return value.count(" R")
+    return 1 if kind == "xref" else 0
+
+
+def deadline_columns(doc, extract_until, metrics):
+    # (columns of the pages extracted, number of pages skipped)
+    records = []
+    spent = stream_bytes = done = 0
+    for page_index in range(doc.page_count):
+        now = time.perf_counter()
+        if now >= extract_until:
+            return line_columns(records), doc.page_count - page_index
+        page = doc.load_page(page_index)
+        # Pages made of many small streams are slow even to size
+        if (now + content_streams(doc, page) * DEADLINE_STREAM_SECONDS >
+                extract_until):
+            metrics.count("skipped_pages", 1)
+            continue
+        size = len(page.read_contents())
+        if not done:
+            cost = size * DEADLINE_BYTE_SECONDS
+        else:
+            cost = spent * size / stream_bytes if stream_bytes else spent / done
+        if now + cost > extract_until:
+            metrics.count("skipped_pages", 1)
+            continue
+        records.extend(iter_page_lines(page, page_index + 1))
+        spent += time.perf_counter() - now
+        stream_bytes += size
+        done += 1
+    return line_columns(records), 0
+
+
+def deadline_predict(model, label_map, X, pages, candidates, profile,
+                     deadline, metrics):
+    # Class indices for X: the full model while it fits before `deadline`,
+    # then a forest cut to fewer trees, then the rule-based pass
+    n = len(X)
+    preds = np.empty(n, dtype=np.int64)
+    done = 0
+    if n and time.perf_counter() < deadline:
+        # Probe: the first DEADLINE_PROBE_LINES lines. The CRF labels whole
+        # pages, so a page the probe cut short is classified again.
+        probe = min(DEADLINE_PROBE_LINES, n)
+        start = time.perf_counter()
+        preds[:probe] = predict_lines(model, X[:probe], pages[:probe])
+        line_seconds = (time.perf_counter() - start) / probe
+        done = probe
+        if (isinstance(model, CrfModel) and probe < n and
+                pages[probe] == pages[probe - 1]):
+            done = int(np.searchsorted(pages, pages[probe], side='left'))
+        rest = n - done
+        remaining = deadline - time.perf_counter()
+        if rest and line_seconds * rest <= remaining:
+            preds[done:] = predict_lines(model, X[done:], pages[done:])
+            done = n
+        elif rest and isinstance(model, CompactForest):
+            n_trees = min(int(remaining / (line_seconds * rest) *
+                              model.n_trees), model.n_trees)
+            if n_trees >= DEADLINE_MIN_TREES:
+                preds[done:] = model.predict(X[done:], n_trees=n_trees)
+                metrics.count("trees", n_trees)
+                done = n
+    if done < n:
+        rest = np.arange(n) >= done
+        levels = rule_heading_levels(select_rows(candidates, rest), profile)
+        preds[done:] = [label_map[level] for level in levels]
+        metrics.count("rule_lines", n - done)
+    return preds
+
+
+def deadline_outline(pdf_path, model, label_map, inv_label_map, deadline,
+                     prune_words=None, drop_repeated=False, metrics=None):
+    # `deadline` is a time.perf_counter() value
+    metrics = metrics or DocMetrics()
+    budget = deadline - time.perf_counter()
+    with metrics.stage("open"):
+        doc = open_pdf(pdf_path)
+    with doc:
+        metrics.count("pages", doc.page_count)
+        with metrics.stage("extract"):
+            cols, unread = deadline_columns(
+                doc, deadline - budget * (1 - DEADLINE_EXTRACT_SHARE), metrics)
+    metrics.count("skipped_pages", unread)
+    skipped = metrics.counts.get("skipped_pages", 0)
+    n = len(cols['text'])
+    metrics.count("lines", n)
+    if not n and not skipped:
+        return None, {}
+    with metrics.stage("features"):
+        mask, X, pages, _ = candidate_features(cols, prune_words,
+                                               drop_repeated)
+    preds = np.full(n, label_map['not_heading'])
+    with metrics.stage("predict"):
+        preds[mask] = deadline_predict(model, label_map, X, pages,
+                                       select_rows(cols, mask),
+                                       font_profile(cols), deadline, metrics)
+    with metrics.stage("build"):
+        output = outline_output(line_records(cols), preds, inv_label_map)
+    output["truncated"] = bool(skipped)
+    return output, {"lines": n}
+
+
+def order_by_pages(pdf_files):
+    # Shortest first by page count, which minimizes mean completion time
+    def page_count(pdf_path):
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
+    return sorted(pdf_files, key=page_count)
+
+# Helper: split a document into page ranges for the worker pool
+
+
+def page_shards(page_count, shard_pages=SHARD_PAGES):
+    if page_count <= shard_pages:
+        return [(0, page_count)]
+    return [(start, min(start + shard_pages, page_count))
+            for start in range(0, page_count, shard_pages)]
 
-def main(force_retrain=False):
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    model, label_map, inv_label_map = load_rf_model(
-        force_retrain=force_retrain)
-    pdf_files = glob.glob(os.path.join(INPUT_DIR, "*.pdf"))
+# Worker pool: each process loads the model once and classifies page ranges
+
+
+_worker_model = None
+
+
+def _init_worker(kind="rf", mapped_dir=None):
+    global _worker_model
+    if mapped_dir is not None:
+        model = CompactForest.load_mapped(mapped_dir)
+        _worker_model = (model, *model.label_maps())
+    else:
+        _worker_model = load_model(kind)
+
+
+@contextlib.contextmanager
+def worker_pool(model, workers):
+    # Forest workers map one shared read-only copy of the model's arrays
+    # (compact_forest.mapped_model) instead of each loading their own
+    if not isinstance(model, CompactForest):
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(model_kind(model),)) as pool:
+            yield pool
+        return
+    with mapped_model(model) as mapped_dir, ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=("rf", mapped_dir)) as pool:
+        yield pool
+
+
+def _extract_and_predict(pdf_path, page_range, prune_words=None,
+                         classify=True, drop_repeated=False, page_cache=None):
+    metrics = DocMetrics()
+    model, label_map, inv_label_map = _worker_model
+    if page_cache is not None and classify:
+        lines, preds, stats = classify_pdf_pages(
+            pdf_path, model, label_map, inv_label_map, page_cache, page_range,
+            prune_words, metrics, drop_repeated)
+        return lines, preds, stats, metrics.as_dict()
+    if page_cache is not None:
+        cols, pages = cached_page_columns(pdf_path, page_cache, page_range,
+                                          metrics)
+        store_pages(page_cache, cols, pages)
+    else:
+        cols = extract_pdf_columns(pdf_path, page_range, metrics)
+    if not classify:
+        # Pruning needs the whole document's font profile, and dropping
+        # repeated lines its every page; the parent classifies once all
+        # shards are back.
+        return cols, metrics.as_dict()
+    lines, preds, stats = classify_columns(model, label_map, cols, prune_words,
+                                           metrics, drop_repeated)
+    return lines, preds, stats, metrics.as_dict()
+
+# Helper: write one outline JSON
+
+
+def outline_output(lines, preds, inv_label_map):
+    title, outline = build_outline(lines, preds, inv_label_map)
+    return {
+        "title": title if title else "",
+        "outline": outline
+    }
+
+
+def save_output(pdf_path, output, ndjson=None, write_json=True):
+    if ndjson is not None:
+        ndjson.write({"file": pdf_path, **output})
+    if not write_json:
+        return
+    base = os.path.splitext(os.path.basename(pdf_path))[0]
+    out_path = os.path.join(OUTPUT_DIR, base + ".json")
+    # Temp file plus rename: readers never see a partial file, and several
+    # writers of one output leave one complete copy
+    atomic_write_json(out_path, output)
+    print(f"Saved outline to {out_path}")
+
+# Helper: look up a PDF in the outline cache; returns (key, output or None)
+
+
+def cache_lookup(cache, pdf_path, metrics=None):
+    if cache is None:
+        return None, None
+    metrics = metrics or DocMetrics()
+    with metrics.stage("cache"):
+        key = cache.key(file_digest(pdf_path))
+        output = cache.get(key)
+    if output is not None:
+        metrics.count("cache_hit", 1)
+        metrics.count("headings", len(output["outline"]))
+    return key, output
+
+# Helper: outline from the PDF's own bookmarks if they pass the checks in
+# outline_toc; returns None when the model has to run
+
+
+def toc_lookup(pdf_path, metrics=None):
+    metrics = metrics or DocMetrics()
+    with metrics.stage("toc"):
+        with open_pdf(pdf_path) as doc:
+            output, reason = toc_outline(doc)
+            page_count = doc.page_count
+    if output is None:
+        if reason != "no bookmarks":
+            print(f"Ignoring bookmarks of {pdf_path}: {reason}")
+        return None
+    metrics.count("toc", 1)
+    metrics.count("pages", page_count)
+    metrics.count("headings", len(output["outline"]))
+    return output
+
+# Page cache (--page-cache-dir): entries keyed on outline_cache.page_digest
+# hold one page's line records, its labels when classification does not look
+# across pages (no --prune or --drop-repeated), and the seconds the page took
+# to extract and classify. A revised document then only extracts and
+# classifies the pages whose digest changed.
+
+
+def page_rows(cols, page_num):
+    # Lines are in page order, so each page is one slice of the columns
+    return (int(np.searchsorted(cols['page'], page_num, side='left')),
+            int(np.searchsorted(cols['page'], page_num, side='right')))
+
+
+def cached_page_columns(pdf_path, page_cache, page_range=None, metrics=None):
+    # Columns of every page in range, taken from the cache where possible,
+    # plus one {page, key, entry (None on a miss), seconds} per page
+    metrics = metrics or DocMetrics()
+    with metrics.stage("open"):
+        doc = open_pdf(pdf_path)
+    records, pages = [], []
+    with doc:
+        for page_index in range(*(page_range or (0, doc.page_count))):
+            page = doc.load_page(page_index)
+            with metrics.stage("cache"):
+                key = page_cache.key(page_digest(doc, page))
+                entry = page_cache.get(key)
+            start = time.perf_counter()
+            if entry is not None:
+                records.extend((text, page_index + 1, *values)
+                               for text, *values in entry["lines"])
+            else:
+                with metrics.stage("extract"):
+                    records.extend(iter_page_lines(page, page_index + 1))
+            pages.append({"page": page_index + 1, "key": key, "entry": entry,
+                          "seconds": time.perf_counter() - start})
+    hits = [info["entry"] for info in pages if info["entry"] is not None]
+    metrics.count("pages", len(pages))
+    metrics.count("lines", len(records))
+    metrics.count("page_hits", len(hits))
+    metrics.count("page_misses", len(pages) - len(hits))
+    metrics.count("page_saved_seconds", sum(e["seconds"] for e in hits))
+    return line_columns(records), pages
+
+
+def store_pages(page_cache, cols, pages, labels=None, line_seconds=0.0):
+    # Writes the pages that were extracted, and with `labels` also those
+    # cached without labels. line_seconds is the classification cost per line.
+    values = [cols[name].tolist() for name in LINE_COLUMNS]
+    for info in pages:
+        entry = info["entry"]
+        if entry is not None and (labels is None or
+                                  entry.get("labels") is not None):
+            continue
+        lo, hi = page_rows(cols, info["page"])
+        seconds = entry["seconds"] if entry is not None else info["seconds"]
+        page_cache.put(info["key"], {
+            "lines": [[cols['text'][i]] + [v[i] for v in values]
+                      for i in range(lo, hi)],
+            "labels": labels[lo:hi] if labels is not None else None,
+            "seconds": seconds + line_seconds * (hi - lo),
+        })
+
+
+def classify_pdf_pages(pdf_path, model, label_map, inv_label_map, page_cache,
+                       page_range=None, prune_words=None, metrics=None,
+                       drop_repeated=False):
+    metrics = metrics or DocMetrics()
+    cols, pages = cached_page_columns(pdf_path, page_cache, page_range,
+                                      metrics)
+    if prune_words is not None or drop_repeated:
+        # Document-wide passes: only the line records are reused
+        lines, preds, stats = classify_columns(model, label_map, cols,
+                                               prune_words, metrics,
+                                               drop_repeated)
+        store_pages(page_cache, cols, pages)
+        return lines, preds, stats
+    n = len(cols['text'])
+    preds = np.full(n, label_map['not_heading'])
+    todo = np.ones(n, dtype=bool)
+    for info in pages:
+        labels = (info["entry"] or {}).get("labels")
+        if labels is not None:
+            lo, hi = page_rows(cols, info["page"])
+            preds[lo:hi] = [label_map[label] for label in labels]
+            todo[lo:hi] = False
+    _, todo_preds, stats = classify_columns(model, label_map,
+                                            select_rows(cols, todo),
+                                            metrics=metrics)
+    preds[todo] = todo_preds
+    classified = stats["lines"]
+    stats["lines"] = n
+    store_pages(page_cache, cols, pages,
+                [inv_label_map[int(p)] for p in preds],
+                stats["classify_seconds"] / classified if classified else 0.0)
+    return line_records(cols), preds, stats
+
+
+def report_deadline(metrics):
+    if "skipped_pages" not in metrics.counts:
+        return
+    skipped = metrics.counts["skipped_pages"]
+    trees = f" ({metrics.counts['trees']} trees)" if metrics.counts.get(
+        "trees") else ""
+    print(f"  deadline: {metrics.strategy()}{trees}" +
+          (f", truncated ({skipped} pages skipped)" if skipped else ""))
+
+
+def report_page_cache(metrics):
+    hits = metrics.counts.get("page_hits", 0)
+    total = hits + metrics.counts.get("page_misses", 0)
+    if not total:
+        return
+    print(f"  page cache: {hits}/{total} pages ({hits / total:.1%}), "
+          f"~{metrics.counts.get('page_saved_seconds', 0) * 1000:.1f} ms "
+          f"saved")
+
+# Helper: outline for one PDF; returns (output or None if no text, stats)
+
+
+def process_pdf(pdf_path, model, label_map, inv_label_map, prune_words=None,
+                cache=None, page_window=None, toc=False, drop_repeated=False,
+                page_cache=None, deadline_ms=None, metrics=None):
+    metrics = metrics or DocMetrics(pdf_path)
+    key, output = cache_lookup(cache, pdf_path, metrics)
+    if output is not None:
+        return output, {}
+    if toc:
+        output = toc_lookup(pdf_path, metrics)
+        if output is not None:
+            if deadline_ms is not None:
+                output["truncated"] = False
+            if cache is not None:
+                cache.put(key, output)
+            return output, {}
+    if deadline_ms is not None:
+        output, stats = deadline_outline(
+            pdf_path, model, label_map, inv_label_map,
+            metrics.started + deadline_ms / 1000, prune_words, drop_repeated,
+            metrics)
+        if output is not None and (output["truncated"] or
+                                   metrics.strategy() != "model"):
+            # Partial results are not cached
+            metrics.count("headings", len(output["outline"]))
+            return output, stats
+    elif page_window:
+        output, stats = stream_outline(pdf_path, model, inv_label_map,
+                                       page_window, metrics=metrics)
+    elif page_cache is not None:
+        lines, preds, stats = classify_pdf_pages(
+            pdf_path, model, label_map, inv_label_map, page_cache,
+            prune_words=prune_words, metrics=metrics,
+            drop_repeated=drop_repeated)
+        if not lines:
+            return None, {}
+        with metrics.stage("build"):
+            output = outline_output(lines, preds, inv_label_map)
+    else:
+        cols = extract_pdf_columns(pdf_path, metrics=metrics)
+        if not cols['text']:
+            return None, {}
+        lines, preds, stats = classify_columns(model, label_map, cols,
+                                               prune_words, metrics,
+                                               drop_repeated)
+        with metrics.stage("build"):
+            output = outline_output(lines, preds, inv_label_map)
+    if output is not None:
+        metrics.count("headings", len(output["outline"]))
+        if cache is not None:
+            cache.put(key, output)
+    return output, stats
+
+
+def run_serial(pdf_files, process, emit=save_output, recorder=None):
+    recorder = recorder or MetricsRecorder()
+    totals = {}
     for pdf_path in pdf_files:
-        base = os.path.splitext(os.path.basename(pdf_path))[0]
         print(f"Processing {pdf_path} ...")
-        lines, feats = extract_pdf_lines_and_features(pdf_path)
+        metrics = DocMetrics(pdf_path)
+        with recorder.profile(metrics):
+            output, stats = process(pdf_path, metrics=metrics)
+            if output is not None:
+                with metrics.stage("write"):
+                    emit(pdf_path, output)
+        recorder.record(metrics, stats)
+        if output is None:
+            print(f"No text found in {pdf_path}")
+            continue
+        print(f"  {metrics.path()} path")
+        report_deadline(metrics)
+        report_page_cache(metrics)
+        report_pruning(stats)
+        merge_stats(totals, stats)
+    return totals
+
+
+def run_parallel(pdf_files, model, label_map, inv_label_map, workers,
+                 shard_pages=SHARD_PAGES, prune_words=None, cache=None,
+                 emit=save_output, recorder=None, toc=False,
+                 drop_repeated=False, page_cache=None):
+    # Submit the shards of up to DOCS_IN_FLIGHT_PER_WORKER * workers documents
+    # ahead, then merge results back in input order so outputs match the
+    # serial run exactly; a document's futures are dropped once it is
+    # written. Stage times are summed over the shards; wall time runs from
+    # submission to the document's write.
+    recorder = recorder or MetricsRecorder()
+    totals = {}
+
+    def submit(pool, pdf_path):
+        metrics = DocMetrics(pdf_path)
+        key, output = cache_lookup(cache, pdf_path, metrics)
+        if output is None and toc:
+            output = toc_lookup(pdf_path, metrics)
+            if output is not None and cache is not None:
+                cache.put(key, output)
+        if output is not None:
+            return pdf_path, metrics, key, output, None, None
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+        shards = page_shards(page_count, shard_pages)
+        classify = ((prune_words is None and not drop_repeated) or
+                    len(shards) == 1)
+        futures = [pool.submit(_extract_and_predict, pdf_path, shard,
+                               prune_words, classify, drop_repeated,
+                               page_cache)
+                   for shard in shards]
+        return pdf_path, metrics, key, None, classify, futures
+
+    def finish(pdf_path, metrics, key, output, classify, futures):
+        print(f"Processing {pdf_path} ...")
+        if output is not None:
+            with metrics.stage("write"):
+                emit(pdf_path, output)
+            recorder.record(metrics)
+            print(f"  {metrics.path()} path")
+            return
+        if classify:
+            lines, preds, stats = [], [], {}
+            for future in futures:
+                (shard_lines, shard_preds, shard_stats,
+                 shard_metrics) = future.result()
+                lines.extend(shard_lines)
+                preds.extend(shard_preds)
+                merge_stats(stats, shard_stats)
+                metrics.merge(shard_metrics)
+        else:
+            parts = []
+            for future in futures:
+                shard_cols, shard_metrics = future.result()
+                parts.append(shard_cols)
+                metrics.merge(shard_metrics)
+            lines, preds, stats = classify_columns(
+                model, label_map, concat_columns(parts), prune_words,
+                metrics, drop_repeated)
         if not lines:
+            recorder.record(metrics, stats)
             print(f"No text found in {pdf_path}")
+            return
+        report_pruning(stats)
+        merge_stats(totals, stats)
+        with metrics.stage("build"):
+            output = outline_output(lines, preds, inv_label_map)
+        metrics.count("headings", len(output["outline"]))
+        if cache is not None:
+            cache.put(key, output)
+        with metrics.stage("write"):
+            emit(pdf_path, output)
+        recorder.record(metrics, stats)
+        print(f"  {metrics.path()} path")
+        report_page_cache(metrics)
+
+    with worker_pool(model, workers) as pool:
+        window = collections.deque()
+        for pdf_path in pdf_files:
+            window.append(submit(pool, pdf_path))
+            if len(window) >= DOCS_IN_FLIGHT_PER_WORKER * workers:
+                finish(*window.popleft())
+        while window:
+            finish(*window.popleft())
+    return totals
+
+# Streaming mode: process paths as they arrive (stdin or a watched folder).
+# A failing document produces an error record instead of stopping the stream.
+
+
+def run_stream(paths, process, emit=save_output, ndjson=None, recorder=None):
+    recorder = recorder or MetricsRecorder()
+    totals = {}
+    for pdf_path in paths:
+        print(f"Processing {pdf_path} ...")
+        metrics = DocMetrics(pdf_path)
+        try:
+            with recorder.profile(metrics):
+                output, stats = process(pdf_path, metrics=metrics)
+        except Exception as exc:
+            print(f"Failed to process {pdf_path}: {exc}")
+            if ndjson is not None:
+                ndjson.write({"file": pdf_path,
+                              "error": f"{type(exc).__name__}: {exc}"})
             continue
-        preds = model.predict(feats)
-        title, outline = build_outline(lines, preds, inv_label_map)
-        output = {
-            "title": title if title else "",
-            "outline": outline
-        }
-        out_path = os.path.join(OUTPUT_DIR, base + ".json")
-        with open(out_path, "w", encoding="utf-8") as f:
-            json.dump(output, f, indent=2, ensure_ascii=False)
-        print(f"Saved outline to {out_path}")
+        if output is None:
+            print(f"No text found in {pdf_path}")
+            output = {"title": "", "outline": []}
+        merge_stats(totals, stats)
+        with metrics.stage("write"):
+            emit(pdf_path, output)
+        recorder.record(metrics, stats)
+        print(f"  {metrics.path()} path")
+        report_deadline(metrics)
+        report_page_cache(metrics)
+    return totals
+
+# Lease mode: several instances share one input folder. Each document is
+# claimed through outline_leases before it is processed and recorded as done
+# or failed afterwards, so no two nodes process it, and the documents of a
+# crashed node are picked up once its leases expire.
+
+
+def run_leased(pdf_files, process, leases, emit=save_output, recorder=None,
+               poll_seconds=LEASE_POLL_SECONDS):
+    recorder = recorder or MetricsRecorder()
+    totals = {}
+    print(f"Node {leases.node}")
+    try:
+        for pdf_path in leased_paths(leases, pdf_files, poll_seconds):
+            print(f"Processing {pdf_path} ...")
+            metrics = DocMetrics(pdf_path)
+            try:
+                with leases.heartbeat(pdf_path), recorder.profile(metrics):
+                    output, stats = process(pdf_path, metrics=metrics)
+                    if output is None:
+                        print(f"No text found in {pdf_path}")
+                        output = {"title": "", "outline": []}
+                    with metrics.stage("write"):
+                        emit(pdf_path, output)
+            except KeyboardInterrupt:
+                leases.release(pdf_path)
+                raise
+            except Exception as exc:
+                print(f"Failed to process {pdf_path}: {exc}")
+                leases.fail(pdf_path, f"{type(exc).__name__}: {exc}")
+                leases.write_manifest(MANIFEST_SECONDS)
+                continue
+            recorder.record(metrics, stats)
+            leases.complete(pdf_path, headings=len(output["outline"]),
+                            wall_seconds=metrics.wall_seconds)
+            leases.write_manifest(MANIFEST_SECONDS)
+            merge_stats(totals, stats)
+            print(f"  {metrics.path()} path")
+    finally:
+        leases.write_manifest()
+    return totals
+
+# Main processing loop
+
+
+def main(force_retrain=False, workers=1, shard_pages=SHARD_PAGES,
+         prune_words=None, cache_dir=None, cache_max_bytes=CACHE_MAX_BYTES,
+         stream=None, ndjson_path=None, write_json=True,
+         ndjson_max_bytes=NDJSON_MAX_BYTES, poll_seconds=POLL_SECONDS,
+         page_window=None, metrics_path=None, profile_top=0,
+         profile_dir="profiles", model_type="rf", toc=False,
+         drop_repeated=False, page_cache_dir=None, deadline_ms=None,
+         lease_dir=None, lease_seconds=LEASE_SECONDS,
+         lease_poll_seconds=LEASE_POLL_SECONDS):
+    if write_json:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+    ndjson = None
+    if ndjson_path:
+        ndjson = NdjsonWriter(ndjson_path, ndjson_max_bytes)
+    emit = functools.partial(save_output, ndjson=ndjson, write_json=write_json)
+    # Keep stdout clean for records when streaming NDJSON to it
+    log_target = sys.stderr if ndjson_path == "-" else sys.stdout
+    with contextlib.redirect_stdout(log_target):
+        model, label_map, inv_label_map = load_model(model_type,
+                                                     force_retrain)
+        cache = None
+        if cache_dir:
+            cache = OutlineCache(cache_dir, model_fingerprint(model),
+                                 cache_max_bytes,
+                                 variant=f"prune={prune_words}" +
+                                 (",toc" if toc else "") +
+                                 (",repeated" if drop_repeated else "") +
+                                 (",deadline" if deadline_ms else ""))
+        page_cache = None
+        if page_cache_dir:
+            page_cache = OutlineCache(page_cache_dir, model_fingerprint(model),
+                                      cache_max_bytes, variant="pages")
+        recorder = MetricsRecorder(metrics_path, profile_top, profile_dir)
+        process = functools.partial(
+            process_pdf, model=model, label_map=label_map,
+            inv_label_map=inv_label_map, prune_words=prune_words, cache=cache,
+            page_window=page_window, toc=toc, drop_repeated=drop_repeated,
+            page_cache=page_cache, deadline_ms=deadline_ms)
+        try:
+            if stream:
+                paths = (stdin_paths() if stream == "stdin" else
+                         watch_paths(INPUT_DIR, poll_seconds))
+                totals = run_stream(paths, process, emit, ndjson, recorder)
+            elif lease_dir:
+                pdf_files = glob.glob(os.path.join(INPUT_DIR, "*.pdf"))
+                leases = LeaseDir(lease_dir, lease_seconds=lease_seconds)
+                totals = run_leased(pdf_files, process, leases, emit, recorder,
+                                    lease_poll_seconds)
+            elif workers > 1:
+                pdf_files = glob.glob(os.path.join(INPUT_DIR, "*.pdf"))
+                totals = run_parallel(pdf_files, model, label_map,
+                                      inv_label_map, workers, shard_pages,
+                                      prune_words, cache, emit, recorder, toc,
+                                      drop_repeated, page_cache)
+            else:
+                pdf_files = glob.glob(os.path.join(INPUT_DIR, "*.pdf"))
+                if deadline_ms:
+                    pdf_files = order_by_pages(pdf_files)
+                totals = run_serial(pdf_files, process, emit, recorder)
+        except KeyboardInterrupt:
+            totals = {}
+        finally:
+            if ndjson is not None:
+                ndjson.close()
+            recorder.close()
+        recorder.summary()
+        if prune_words is not None or drop_repeated:
+            report_pruning(totals, prefix="Total: ")
+        if cache is not None:
+            stats = cache.stats()
+            print(f"Cache: {stats['hits']} hits, {stats['misses']} misses "
+                  f"({stats['hit_rate']:.1%} hit rate), "
+                  f"{stats['evictions']} evictions")
 
 
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser(
-        description="PDF Outline Extractor with RandomForest")
+        description="PDF Outline Extractor with RandomForest or CRF")
+    parser.add_argument('--model', choices=['rf', 'crf'], default='rf',
+                        help='rf classifies lines independently; crf labels '
+                             'each page as one sequence (default: %(default)s)')
+    parser.add_argument('--toc', action='store_true',
+                        help="Use a PDF's embedded bookmarks as its outline "
+                             "when they pass quality checks, skipping text "
+                             "extraction and the model")
+    parser.add_argument('--drop-repeated', action='store_true',
+                        help='Label running headers, footers and page numbers '
+                             'repeated across pages not_heading without '
+                             'running the model on them')
+    parser.add_argument('--deadline-ms', type=float, metavar='MS',
+                        help='Time budget per document. Early pages come '
+                             'first; when time runs short, pages are skipped '
+                             '(output marked "truncated") and classification '
+                             'falls back to fewer trees or font rules. '
+                             'Serial batches run shortest-first; streaming '
+                             'and --lease-dir runs keep their order')
     parser.add_argument('--retrain', action='store_true',
-                        help='Retrain the model from CSV')
+                        help='Retrain the RandomForest model from CSV')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes (default: 1)')
+    parser.add_argument('--shard-pages', type=int, default=SHARD_PAGES,
+                        help='Split PDFs longer than this many pages across '
+                             'workers (default: %(default)s)')
+    parser.add_argument('--prune', action='store_true',
+                        help='Skip the model for lines a font-profile prepass '
+                             'marks as body text')
+    parser.add_argument('--prune-words', type=int, default=PRUNE_WORDS,
+                        help='With --prune, body-size non-bold lines with more '
+                             'words than this are labeled not_heading '
+                             '(default: %(default)s)')
+    parser.add_argument('--cache-dir',
+                        help='Reuse outlines of previously seen PDFs from this '
+                             'directory')
+    parser.add_argument('--page-cache-dir',
+                        help='Reuse the lines and labels of unchanged pages '
+                             'from this directory, so revised PDFs only '
+                             'reprocess the pages that changed')
+    parser.add_argument('--cache-max-mb', type=float,
+                        default=CACHE_MAX_BYTES / (1024 * 1024),
+                        help='Evict least recently used cache entries above '
+                             'this size (default: %(default)s)')
+    parser.add_argument('--stream', choices=['stdin', 'watch'],
+                        help='Process PDF paths read from stdin, or watch '
+                             'the input folder for new files')
+    parser.add_argument('--poll-seconds', type=float, default=POLL_SECONDS,
+                        help='Folder scan interval for --stream watch '
+                             '(default: %(default)s)')
+    parser.add_argument('--ndjson', metavar='PATH',
+                        help="Also write one JSON record per document to PATH "
+                             "('-' for stdout)")
+    parser.add_argument('--ndjson-max-mb', type=float,
+                        default=NDJSON_MAX_BYTES / (1024 * 1024),
+                        help='Rotate the NDJSON file past this size '
+                             '(default: %(default)s)')
+    parser.add_argument('--no-json-files', action='store_true',
+                        help='Do not write per-file JSON into the output folder')
+    parser.add_argument('--lease-dir', metavar='DIR',
+                        help='Share the input folder with other instances: '
+                             'claim each PDF through lease files in DIR (on '
+                             'the shared filesystem) so every PDF is '
+                             'processed once')
+    parser.add_argument('--lease-seconds', type=float, default=LEASE_SECONDS,
+                        help="A node's lease expires this long after its "
+                             "last heartbeat (default: %(default)s)")
+    parser.add_argument('--lease-poll-seconds', type=float,
+                        default=LEASE_POLL_SECONDS,
+                        help='How often idle nodes look for expired leases '
+                             '(default: %(default)s)')
+    parser.add_argument('--page-window', type=int, metavar='PAGES',
+                        help='Parse and classify this many pages at a time to '
+                             'bound memory on very large PDFs (serial and '
+                             'streaming modes)')
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='Append one JSON metrics record per document '
+                             '(stage times, counts, peak RSS) to PATH')
+    parser.add_argument('--profile', type=int, default=0, metavar='N',
+                        help='cProfile each document and keep profiles of the '
+                             'N slowest (serial and streaming modes)')
+    parser.add_argument('--profile-dir', default='profiles',
+                        help='Where --profile writes .prof files '
+                             '(default: %(default)s)')
     args = parser.parse_args()
-    main(force_retrain=args.retrain)
+    if args.profile and args.workers > 1:
+        parser.error("--profile runs in-process; use it without --workers")
+    if args.retrain and args.model == 'crf':
+        parser.error("--retrain retrains the RandomForest; train the CRF "
+                     "with datasets/train_crf_model_custom.py")
+    if args.page_window and args.prune:
+        parser.error("--prune needs the whole document's font profile and "
+                     "cannot be combined with --page-window")
+    if args.deadline_ms is not None:
+        if args.deadline_ms <= 0:
+            parser.error("--deadline-ms must be positive")
+        for flag, value in (("--workers", args.workers > 1),
+                            ("--page-window", args.page_window),
+                            ("--page-cache-dir", args.page_cache_dir)):
+            if value:
+                parser.error(f"--deadline-ms cannot be combined with {flag}")
+    if args.lease_dir and (args.workers > 1 or args.stream):
+        parser.error("--lease-dir runs one document at a time per instance; "
+                     "use it without --workers and --stream")
+    if args.stream and args.workers > 1:
+        parser.error("--stream processes documents one at a time as they "
+                     "arrive; use it without --workers")
+    if args.page_window and args.workers > 1:
+        parser.error("--page-window applies to serial and streaming modes; "
+                     "use it without --workers")
+    if args.page_window and args.page_cache_dir:
+        parser.error("--page-cache-dir cannot be combined with --page-window")
+    if args.page_window and args.drop_repeated:
+        parser.error("--drop-repeated needs every page of the document and "
+                     "cannot be combined with --page-window")
+    main(force_retrain=args.retrain, workers=args.workers,
+         shard_pages=args.shard_pages,
+         prune_words=args.prune_words if args.prune else None,
+         cache_dir=args.cache_dir,
+         cache_max_bytes=int(args.cache_max_mb * 1024 * 1024),
+         stream=args.stream, ndjson_path=args.ndjson,
+         write_json=not args.no_json_files,
+         ndjson_max_bytes=int(args.ndjson_max_mb * 1024 * 1024),
+         poll_seconds=args.poll_seconds, page_window=args.page_window,
+         metrics_path=args.metrics, profile_top=args.profile,
+         profile_dir=args.profile_dir, model_type=args.model, toc=args.toc,
+         drop_repeated=args.drop_repeated,
+         page_cache_dir=args.page_cache_dir, deadline_ms=args.deadline_ms,
+         lease_dir=args.lease_dir, lease_seconds=args.lease_seconds,
+         lease_poll_seconds=args.lease_poll_seconds)
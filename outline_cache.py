@@ -0,0 +1,144 @@
+import os
+import json
+import hashlib
+
+from atomic_files import atomic_write_json
+from pdf_features import FEATURE_SET_VERSION
+
+# Default cache size limit before least-recently-used entries are evicted
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Eviction goes down to this share of the limit, so the directory scan it
+# needs is paid once per many writes rather than on every write
+CACHE_LOW_WATER = 0.9
+# The size is tracked from this process's own writes; the directory is
+# re-scanned when that estimate passes the limit, and after this many writes
+# so that entries written by other processes are counted too
+CACHE_RESCAN_WRITES = 1000
+
+# Helper: SHA-256 of a file's contents
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def bytes_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+# Helper: SHA-256 of what a PyMuPDF page's text extraction depends on: its
+# size and rotation, content stream, form XObject streams and font
+# descriptions. Object numbers are left out, so an unchanged page still
+# matches after the rest of the file is rewritten.
+
+
+def page_digest(doc, page):
+    digest = hashlib.sha256()
+    digest.update(repr((tuple(page.rect), page.rotation)).encode())
+    digest.update(page.read_contents())
+    for xref, *_ in page.get_xobjects():
+        digest.update(doc.xref_stream(xref) or b"")
+    for font in page.get_fonts():
+        digest.update(repr(font[1:6]).encode())
+    return digest.hexdigest()
+
+# On-disk cache of {title, outline} results keyed by PDF content, model file
+# and feature-set version. Entries are written atomically (temp file plus
+# rename), so several processes can share one cache directory. Reads touch
+# the entry's mtime, which drives LRU eviction once the size limit is hit.
+# The same class stores the per-page entries of --page-cache-dir, keyed by
+# page_digest.
+
+
+class OutlineCache:
+    def __init__(self, cache_dir, model_fingerprint, max_bytes=CACHE_MAX_BYTES,
+                 variant=""):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # Anything else that changes the output (e.g. pruning settings)
+        self.namespace = f"{model_fingerprint}:{FEATURE_SET_VERSION}:{variant}"
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._size = None
+        self._writes_since_scan = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, pdf_digest):
+        return hashlib.sha256(
+            f"{pdf_digest}:{self.namespace}".encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                output = json.load(f)
+            os.utime(path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return output
+
+    def put(self, key, output):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        atomic_write_json(path, output, indent=None)
+        self.writes += 1
+        self._writes_since_scan += 1
+        if self._size is not None:
+            self._size += os.path.getsize(path) - replaced
+        if (self._size is None or self._size > self.max_bytes or
+                self._writes_since_scan >= CACHE_RESCAN_WRITES):
+            self.evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue  # removed by another process
+                yield path, st.st_size, st.st_mtime
+
+    def evict(self):
+        # Re-scans the directory; evicts only if it really is over the limit
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        self._writes_since_scan = 0
+        if total > self.max_bytes:
+            target = self.max_bytes * CACHE_LOW_WATER
+            for path, size, _ in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                    self.evictions += 1
+                except FileNotFoundError:
+                    pass
+                total -= size
+        self._size = total
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
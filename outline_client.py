@@ -0,0 +1,123 @@
+import os
+import glob
+import json
+import time
+import socket
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+# Defaults match outline_server.py
+HOST = "127.0.0.1"
+PORT = 8080
+
+# HTTP connection over a Unix socket
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.unix_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.unix_path)
+
+
+def connect(host=HOST, port=PORT, unix_path=None, timeout=300):
+    if unix_path:
+        return UnixHTTPConnection(unix_path, timeout=timeout)
+    return http.client.HTTPConnection(host, port, timeout=timeout)
+
+# Helper: one request; returns (status, decoded JSON)
+
+
+def request(conn, method, path, body=None, headers=None):
+    conn.request(method, path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def extract(conn, pdf_path, send_bytes=True):
+    if send_bytes:
+        with open(pdf_path, "rb") as f:
+            return request(conn, "POST", "/extract", f.read(),
+                           {"Content-Type": "application/pdf"})
+    body = json.dumps({"path": os.path.abspath(pdf_path)})
+    return request(conn, "POST", "/extract", body,
+                   {"Content-Type": "application/json"})
+
+# Load test: `concurrency` clients each send requests over one keep-alive
+# connection until `total` requests are done; reports latency percentiles.
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def load_test(pdf_files, total, concurrency, send_bytes=True, **conn_args):
+    counter = iter(range(total))
+    results = []
+
+    def client():
+        conn = connect(**conn_args)
+        for i in counter:
+            pdf_path = pdf_files[i % len(pdf_files)]
+            start = time.perf_counter()
+            status, _ = extract(conn, pdf_path, send_bytes)
+            results.append((status, time.perf_counter() - start))
+        conn.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(client) for _ in range(concurrency)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+    ok = sorted(latency for status, latency in results if status == 200)
+    conn = connect(**conn_args)
+    _, server_stats = request(conn, "GET", "/stats")
+    conn.close()
+    return {
+        "requests": len(results),
+        "ok": len(ok),
+        "rejected": sum(1 for status, _ in results if status == 503),
+        "concurrency": concurrency,
+        "seconds": elapsed,
+        "throughput_rps": len(results) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(ok, 0.50) * 1000,
+        "p90_ms": percentile(ok, 0.90) * 1000,
+        "p99_ms": percentile(ok, 0.99) * 1000,
+        "server_mean_batch_docs": server_stats["mean_batch_docs"],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Client and load generator for outline_server.py")
+    parser.add_argument('pdfs', nargs='*', help='PDF files (default: input/*.pdf)')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--unix', help='Connect to this Unix socket')
+    parser.add_argument('--paths', action='store_true',
+                        help='Send file paths instead of PDF bytes')
+    parser.add_argument('--load-test', action='store_true',
+                        help='Run a load test instead of printing outlines')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+    pdf_files = args.pdfs or sorted(glob.glob(os.path.join("input", "*.pdf")))
+    conn_args = {"host": args.host, "port": args.port, "unix_path": args.unix}
+    if args.load_test:
+        for concurrency in args.concurrency:
+            print(json.dumps(load_test(pdf_files, args.requests, concurrency,
+                                       not args.paths, **conn_args)))
+    else:
+        conn = connect(**conn_args)
+        for pdf_path in pdf_files:
+            status, output = extract(conn, pdf_path, not args.paths)
+            print(json.dumps({"file": pdf_path, "status": status,
+                              "result": output}, ensure_ascii=False))
+        conn.close()
@@ -0,0 +1,84 @@
+import mmap
+import numpy as np
+
+from extract_outline import (candidate_features, extract_pdf_columns,
+                             line_records, load_model, open_pdf,
+                             outline_output, predict_lines)
+from outline_toc import toc_outline
+
+# Importable API. The model is loaded once (model files are found next to
+# the code, not in the working directory); PDFs can be passed as paths or
+# held in memory as bytes, bytearray, memoryview, mmap or a binary file
+# object. Results are {"title", "outline"} dicts, nothing is written to disk.
+# With toc=True, documents whose embedded bookmarks pass the outline_toc
+# checks are answered from those without parsing; with drop_repeated=True,
+# running headers, footers and page numbers never reach the model.
+#
+#     extractor = OutlineExtractor()
+#     outline = extractor.extract(pdf_bytes)
+#     outlines = extractor.extract_many([f1, f2, f3])  # one predict call
+
+
+def parse_document(source, prune_words=None, metrics=None,
+                   drop_repeated=False):
+    # Parsing half of the pipeline, safe to run in a worker process. Returns
+    # (lines, mask of lines sent to the model, their features, their pages).
+    cols = extract_pdf_columns(source, metrics=metrics)
+    mask, X, pages, repeated = candidate_features(cols, prune_words,
+                                                  drop_repeated)
+    if metrics is not None and drop_repeated:
+        metrics.count("repeated", repeated)
+    return line_records(cols), mask, X, pages
+
+
+class OutlineExtractor:
+    def __init__(self, model="rf", prune_words=None, toc=False,
+                 drop_repeated=False):
+        self.model, self.label_map, self.inv_label_map = load_model(model)
+        self.prune_words = prune_words
+        self.toc = toc
+        self.drop_repeated = drop_repeated
+
+    def parse(self, source, metrics=None):
+        return parse_document(source, self.prune_words, metrics,
+                              self.drop_repeated)
+
+    def predict(self, docs):
+        # Class indices for every line of every parsed document, from a
+        # single predict call over all their feature rows
+        preds = [np.full(len(lines), self.label_map['not_heading'])
+                 for lines, _, _, _ in docs]
+        sizes = [len(X) for _, _, X, _ in docs]
+        if not sum(sizes):
+            return preds
+        X = np.concatenate([X for _, _, X, _ in docs])
+        pages = np.concatenate([pages for _, _, _, pages in docs])
+        doc_ids = np.repeat(np.arange(len(docs)), sizes)
+        flat = predict_lines(self.model, X, doc_ids, pages)
+        for doc_preds, (_, mask, _, _), part in zip(
+                preds, docs, np.split(flat, np.cumsum(sizes)[:-1])):
+            doc_preds[mask] = part
+        return preds
+
+    def outline(self, doc, preds):
+        return outline_output(doc[0], preds, self.inv_label_map)
+
+    def extract(self, source):
+        return self.extract_many([source])[0]
+
+    def toc_outline(self, source):
+        with open_pdf(source) as doc:
+            return toc_outline(doc)[0]
+
+    def extract_many(self, sources):
+        # File objects are read once, since the bookmark check opens them too
+        sources = [source.read() if hasattr(source, "read") and
+                   not isinstance(source, mmap.mmap) else source
+                   for source in sources]
+        outputs = [self.toc_outline(source) if self.toc else None
+                   for source in sources]
+        todo = [i for i, output in enumerate(outputs) if output is None]
+        docs = [self.parse(sources[i]) for i in todo]
+        for i, doc, preds in zip(todo, docs, self.predict(docs)):
+            outputs[i] = self.outline(doc, preds)
+        return outputs
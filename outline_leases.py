@@ -0,0 +1,342 @@
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import socket
+import tempfile
+import threading
+import contextlib
+
+from atomic_files import atomic_write_json
+
+# A lease expires this long after its last heartbeat; holders renew it every
+# LEASE_SECONDS / 4. Node clocks must agree to well within this.
+LEASE_SECONDS = 60.0
+# Nodes with nothing to claim re-scan for expired leases this often
+LEASE_POLL_SECONDS = 2.0
+# manifest.json reads every record, so a node rewrites it at most this often
+# while it works (and once when it finishes)
+MANIFEST_SECONDS = 10.0
+
+# Coordination of several extract_outline instances over one shared
+# directory, using nothing but the filesystem:
+#
+#   leases/<name>.lease  claimed with O_CREAT | O_EXCL, so exactly one node
+#                        wins; its mtime is the holder's last heartbeat
+#   done/<name>.json     written when the output has been renamed into place
+#   failed/<name>.json   written when processing raised
+#   manifest.json        snapshot of done, failed and in-flight documents
+#
+# Done and failed records keep the input's size and mtime; a PDF that has
+# changed since is processed again. An expired lease (crashed node) is moved
+# aside with a rename, which only one node can win, and claimed afresh.
+
+
+def node_name():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _source_state(pdf_path):
+    st = os.stat(pdf_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class LeaseDir:
+    def __init__(self, lease_dir, node=None, lease_seconds=LEASE_SECONDS):
+        self.lease_dir = lease_dir
+        self.node = node or node_name()
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = lease_seconds / 4
+        self.manifest_written = None
+        for sub in ("leases", "done", "failed"):
+            os.makedirs(os.path.join(lease_dir, sub), exist_ok=True)
+
+    def _path(self, sub, pdf_path, ext):
+        return os.path.join(self.lease_dir, sub,
+                            os.path.basename(pdf_path) + ext)
+
+    def lease_path(self, pdf_path):
+        return self._path("leases", pdf_path, ".lease")
+
+    def finished(self, pdf_path):
+        # "done" or "failed" if that record matches the current input
+        state = _source_state(pdf_path)
+        for sub in ("done", "failed"):
+            record = _read_json(self._path(sub, pdf_path, ".json"))
+            if record is not None and record.get("source") == state:
+                return sub
+        return None
+
+    def expired(self, st):
+        return time.time() - st.st_mtime > self.lease_seconds
+
+    def claim(self, pdf_path):
+        # True if this node now holds the lease
+        path = self.lease_path(pdf_path)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            pass
+        else:
+            if not self.expired(st) or not self._break(path, st):
+                return False
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"node": self.node, "file": pdf_path,
+                       "claimed": time.time()}, f)
+        # Finished by another node between our scan and the claim
+        if self.finished(pdf_path):
+            self.release(pdf_path)
+            return False
+        return True
+
+    def _break(self, path, st):
+        # Move an expired lease aside. If the rename took a lease that was
+        # claimed afresh since the stat, it is linked back (link never
+        # replaces an existing file).
+        aside = f"{path}.{self.node}.expired"
+        try:
+            os.rename(path, aside)
+        except FileNotFoundError:
+            return False
+        try:
+            if os.stat(aside).st_ino == st.st_ino:
+                return True
+            with contextlib.suppress(FileExistsError):
+                os.link(aside, path)
+            return False
+        finally:
+            os.remove(aside)
+
+    def holds(self, pdf_path):
+        lease = _read_json(self.lease_path(pdf_path))
+        return lease is not None and lease.get("node") == self.node
+
+    def renew(self, pdf_path):
+        if not self.holds(pdf_path):
+            return False
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(self.lease_path(pdf_path))
+            return True
+        return False
+
+    def release(self, pdf_path):
+        if self.holds(pdf_path):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.lease_path(pdf_path))
+
+    @contextlib.contextmanager
+    def heartbeat(self, pdf_path):
+        # Renews the lease in a background thread while the block runs
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(self.heartbeat_seconds):
+                if not self.renew(pdf_path):
+                    print(f"Lost the lease on {pdf_path}")
+                    return
+        thread = threading.Thread(target=beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def _finish(self, sub, pdf_path, record):
+        record.update(file=pdf_path, node=self.node, finished=time.time(),
+                      source=_source_state(pdf_path))
+        atomic_write_json(self._path(sub, pdf_path, ".json"), record)
+        self.release(pdf_path)
+
+    def complete(self, pdf_path, **record):
+        self._finish("done", pdf_path, record)
+
+    def fail(self, pdf_path, error):
+        self._finish("failed", pdf_path, {"error": error})
+
+    def manifest(self):
+        manifest = {"updated": time.time(), "done": {}, "failed": {},
+                    "in_flight": {}}
+        for sub in ("done", "failed"):
+            directory = os.path.join(self.lease_dir, sub)
+            for name in sorted(os.listdir(directory)):
+                record = _read_json(os.path.join(directory, name))
+                if name.endswith(".json") and record is not None:
+                    manifest[sub][name[:-len(".json")]] = record
+        directory = os.path.join(self.lease_dir, "leases")
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".lease"):
+                continue
+            path = os.path.join(directory, name)
+            lease = _read_json(path)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            manifest["in_flight"][name[:-len(".lease")]] = {
+                "node": (lease or {}).get("node"),
+                "heartbeat_age": time.time() - st.st_mtime,
+                "expired": self.expired(st),
+            }
+        return manifest
+
+    def write_manifest(self, min_interval=0.0):
+        # None when the last write was less than `min_interval` seconds ago
+        now = time.monotonic()
+        if (self.manifest_written is not None and
+                now - self.manifest_written < min_interval):
+            return None
+        self.manifest_written = now
+        manifest = self.manifest()
+        atomic_write_json(os.path.join(self.lease_dir, "manifest.json"),
+                          manifest)
+        return manifest
+
+    def pending(self, pdf_files):
+        return [p for p in pdf_files
+                if os.path.exists(p) and self.finished(p) is None]
+
+
+def leased_paths(leases, pdf_files, poll_seconds=LEASE_POLL_SECONDS):
+    # Claims documents one at a time until every one is done or failed;
+    # waits while the rest are leased by other nodes, whose leases may yet
+    # expire
+    pdf_files = sorted(pdf_files)
+    while True:
+        pending = leases.pending(pdf_files)
+        if not pending:
+            return
+        claimed = False
+        for pdf_path in pending:
+            if leases.finished(pdf_path) is None and leases.claim(pdf_path):
+                claimed = True
+                yield pdf_path
+        if not claimed:
+            time.sleep(poll_seconds)
+
+# Local demo: N extract_outline processes share one temp directory holding
+# copies of the input PDFs. A dead node's leases are planted first, one
+# already expired and one that expires mid-run, so reclaiming is exercised;
+# with kill_after, node 0 is also killed (SIGKILL) mid-run.
+
+
+def demo(nodes=4, copies=4, lease_seconds=3.0, kill_after=None, keep=False):
+    import glob
+    import subprocess
+    here = os.path.dirname(os.path.abspath(__file__))
+    root = tempfile.mkdtemp(prefix="outline-leases-")
+    input_dir = os.path.join(root, "input")
+    os.makedirs(input_dir)
+    sources = sorted(glob.glob(os.path.join(here, "input", "*.pdf")))
+    for i in range(copies):
+        for source in sources:
+            base = os.path.splitext(os.path.basename(source))[0]
+            shutil.copy(source, os.path.join(input_dir, f"{base}-{i}.pdf"))
+    pdf_files = sorted(glob.glob(os.path.join(input_dir, "*.pdf")))
+    lease_dir = os.path.join(root, "leases")
+    dead = LeaseDir(lease_dir, node="dead-node", lease_seconds=lease_seconds)
+    for pdf_path, age in ((pdf_files[0], 10 * lease_seconds), (pdf_files[1], 0)):
+        dead.claim(pdf_path)
+        past = time.time() - age
+        os.utime(dead.lease_path(pdf_path), (past, past))
+    print(f"{len(pdf_files)} PDFs in {input_dir}, {nodes} nodes, "
+          f"leases expire after {lease_seconds}s")
+    start = time.perf_counter()
+    procs = [subprocess.Popen(
+        [sys.executable, "-W", "ignore", os.path.join(here, "extract_outline.py"),
+         "--lease-dir", lease_dir, "--lease-seconds", str(lease_seconds),
+         "--lease-poll-seconds", "0.5"],
+        cwd=root, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        for _ in range(nodes)]
+    if kill_after is not None:
+        time.sleep(kill_after)
+        procs[0].kill()
+    logs = [proc.communicate()[0] for proc in procs]
+    elapsed = time.perf_counter() - start
+    node_names = {}
+    for node, log in enumerate(logs):
+        for line in log.splitlines():
+            if line.startswith("Node "):
+                node_names[node] = line[len("Node "):]
+    processed = {}
+    interrupted = None
+    for node, log in enumerate(logs):
+        for line in log.splitlines():
+            if line.startswith("Processing "):
+                name = os.path.basename(line[len("Processing "):].rstrip(" ."))
+                processed.setdefault(name, []).append(node)
+                if node == 0 and kill_after is not None:
+                    interrupted = name
+    manifest = LeaseDir(lease_dir).write_manifest()
+    outputs = sorted(os.listdir(os.path.join(root, "output")))
+    names = [os.path.basename(p) for p in pdf_files]
+    # The document node 0 was killed on may legitimately run twice
+    if interrupted is not None and manifest["done"].get(
+            interrupted, {}).get("node") == node_names.get(0):
+        interrupted = None
+    duplicated = {name: who for name, who in processed.items()
+                  if len(who) > 1 and name != interrupted}
+    print(f"Finished in {elapsed:.1f}s; exit codes "
+          f"{[proc.returncode for proc in procs]}")
+    for node in range(nodes):
+        print(f"  node {node}: {sum(node in who for who in processed.values())}"
+              f" documents" + (" (killed)" if node == 0 and kill_after is not None
+                               else ""))
+    if interrupted is not None:
+        print(f"  {interrupted} was in flight on the killed node and "
+              f"reclaimed after its lease expired")
+    print(f"done {len(manifest['done'])}/{len(names)}, failed "
+          f"{len(manifest['failed'])}, in flight {len(manifest['in_flight'])}, "
+          f"outputs {len(outputs)}, processed more than once "
+          f"{len(duplicated)}")
+    ok = (sorted(manifest['done']) == names and not manifest['in_flight'] and
+          len(outputs) == len(names) and not duplicated and
+          not any(name.endswith(".tmp") for name in outputs))
+    print("OK" if ok else "FAILED")
+    if keep:
+        print(f"Kept {root}")
+    else:
+        shutil.rmtree(root, ignore_errors=True)
+    return ok
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Inspect or demo lease-coordinated extract_outline runs")
+    sub = parser.add_subparsers(dest='command', required=True)
+    status_cmd = sub.add_parser('status', help='Print the manifest of a '
+                                               'lease directory')
+    status_cmd.add_argument('lease_dir')
+    demo_cmd = sub.add_parser('demo', help='Run several local processes '
+                                           'against one temp directory')
+    demo_cmd.add_argument('--nodes', type=int, default=4)
+    demo_cmd.add_argument('--copies', type=int, default=4,
+                          help='Copies of each input/ PDF (default: '
+                               '%(default)s)')
+    demo_cmd.add_argument('--lease-seconds', type=float, default=3.0)
+    demo_cmd.add_argument('--kill-after', type=float, metavar='SECONDS',
+                          help='SIGKILL node 0 this long after starting')
+    demo_cmd.add_argument('--keep', action='store_true',
+                          help='Keep the temp directory for inspection')
+    args = parser.parse_args()
+    if args.command == 'status':
+        manifest = LeaseDir(args.lease_dir).write_manifest()
+        print(json.dumps(manifest, indent=2, ensure_ascii=False))
+    else:
+        sys.exit(0 if demo(args.nodes, args.copies, args.lease_seconds,
+                           args.kill_after, args.keep) else 1)
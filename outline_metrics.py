@@ -0,0 +1,212 @@
+import os
+import sys
+import json
+import time
+import heapq
+import cProfile
+import pstats
+import resource
+import contextlib
+
+# Stages reported in the summary table, in pipeline order
+STAGES = ["cache", "toc", "open", "extract", "features", "predict", "build", "write"]
+
+
+def peak_rss_mb():
+    # Peak resident set size of this process so far (ru_maxrss is KiB on
+    # Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+# Per-document metrics: wall time per stage plus page/line/heading counts
+
+
+class DocMetrics:
+    def __init__(self, pdf_path=None):
+        self.pdf_path = pdf_path
+        self.stages = {}
+        self.counts = {}
+        self.started = time.perf_counter()
+        self.wall_seconds = None
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = (self.stages.get(name, 0.0) +
+                                 time.perf_counter() - start)
+
+    def count(self, name, value):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def merge(self, data):
+        # Fold in a worker's as_dict() for one shard of the same document
+        for name, seconds in data["stages"].items():
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        for name, value in data["counts"].items():
+            self.count(name, value)
+
+    def path(self):
+        # How the outline was produced: cache hit, bookmarks or the model
+        if self.counts.get("cache_hit"):
+            return "cache"
+        return "toc" if self.counts.get("toc") else "model"
+
+    def strategy(self):
+        # Cheapest classifier a --deadline-ms document fell back to
+        if self.counts.get("rule_lines"):
+            return "rules"
+        return "trees" if self.counts.get("trees") else "model"
+
+    def as_dict(self):
+        return {"stages": self.stages, "counts": self.counts}
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self.started
+
+# Collects DocMetrics: appends JSON lines to `path`, optionally cProfiles
+# every document and keeps the `profile_top` slowest profiles, and prints a
+# summary table at the end of a run.
+
+
+class MetricsRecorder:
+    def __init__(self, path=None, profile_top=0, profile_dir="profiles"):
+        self.path = path
+        self.profile_top = profile_top
+        self.profile_dir = profile_dir
+        self.records = []
+        self._profiles = []  # min-heap of (wall_seconds, seq, pdf_path, profiler)
+        self._file = open(path, "a", encoding="utf-8") if path else None
+
+    @contextlib.contextmanager
+    def profile(self, metrics):
+        if not self.profile_top:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            metrics.finish()
+            entry = (metrics.wall_seconds, len(self.records),
+                     metrics.pdf_path, profiler)
+            if len(self._profiles) < self.profile_top:
+                heapq.heappush(self._profiles, entry)
+            elif entry[0] > self._profiles[0][0]:
+                heapq.heapreplace(self._profiles, entry)
+
+    def record(self, metrics, stats=None):
+        if metrics.wall_seconds is None:
+            metrics.finish()
+        record = {
+            "file": metrics.pdf_path,
+            "timestamp": time.time(),
+            "wall_seconds": metrics.wall_seconds,
+            "stages": metrics.stages,
+            "pages": metrics.counts.get("pages", 0),
+            "lines": metrics.counts.get("lines", 0),
+            "headings": metrics.counts.get("headings", 0),
+            "cache_hit": bool(metrics.counts.get("cache_hit", 0)),
+            "path": metrics.path(),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        if stats and "pruned" in stats:
+            record["pruned"] = stats["pruned"]
+        if "repeated" in metrics.counts:
+            record["repeated"] = metrics.counts["repeated"]
+        if "skipped_pages" in metrics.counts:
+            record["skipped_pages"] = metrics.counts["skipped_pages"]
+            record["truncated"] = bool(metrics.counts["skipped_pages"])
+            record["strategy"] = metrics.strategy()
+        if "page_hits" in metrics.counts:
+            record["page_cache"] = {
+                "hits": metrics.counts["page_hits"],
+                "misses": metrics.counts["page_misses"],
+                "saved_seconds": metrics.counts["page_saved_seconds"],
+            }
+        self.records.append(record)
+        if self._file is not None:
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+        return record
+
+    def write_profiles(self):
+        if not self._profiles:
+            return []
+        os.makedirs(self.profile_dir, exist_ok=True)
+        paths = []
+        for wall, _, pdf_path, profiler in sorted(self._profiles, reverse=True):
+            base = os.path.splitext(os.path.basename(pdf_path or "doc"))[0]
+            out_path = os.path.join(self.profile_dir, base + ".prof")
+            pstats.Stats(profiler).dump_stats(out_path)
+            paths.append((wall, pdf_path, out_path))
+        return paths
+
+    def summary(self, slowest=5):
+        if not self.records:
+            return
+        walls = sorted(r["wall_seconds"] for r in self.records)
+
+        def pct(q):
+            return walls[min(len(walls) - 1, int(q * len(walls)))]
+        print(f"\nProcessed {len(self.records)} documents: "
+              f"{sum(r['pages'] for r in self.records)} pages, "
+              f"{sum(r['lines'] for r in self.records)} lines, "
+              f"{sum(r['headings'] for r in self.records)} headings, "
+              f"peak RSS {max(r['peak_rss_mb'] for r in self.records):.1f} MB")
+        paths = {}
+        for r in self.records:
+            paths[r["path"]] = paths.get(r["path"], 0) + 1
+        print("Paths: " + ", ".join(f"{name} {count}" for name, count in
+                                    sorted(paths.items())))
+        if any("repeated" in r for r in self.records):
+            print(f"Repeated header/footer lines dropped: "
+                  f"{sum(r.get('repeated', 0) for r in self.records)}")
+        deadline_records = [r for r in self.records if "strategy" in r]
+        if deadline_records:
+            strategies = {}
+            for r in deadline_records:
+                strategies[r["strategy"]] = strategies.get(r["strategy"], 0) + 1
+            print(f"Deadline: {sum(r['truncated'] for r in deadline_records)} "
+                  f"truncated ({sum(r['skipped_pages'] for r in deadline_records)}"
+                  f" pages skipped); strategies: " +
+                  ", ".join(f"{name} {count}" for name, count in
+                            sorted(strategies.items())))
+        page_records = [r["page_cache"] for r in self.records
+                        if "page_cache" in r]
+        if page_records:
+            hits = sum(r["hits"] for r in page_records)
+            total = hits + sum(r["misses"] for r in page_records)
+            print(f"Page cache: {hits}/{total} pages "
+                  f"({hits / total if total else 0:.1%} hit rate), "
+                  f"~{sum(r['saved_seconds'] for r in page_records):.3f} s "
+                  f"saved")
+        print(f"{'stage':<10} {'total s':>9} {'mean ms':>9} {'share':>7}")
+        wall_total = sum(walls)
+        for name in STAGES:
+            total = sum(r["stages"].get(name, 0.0) for r in self.records)
+            if not total:
+                continue
+            print(f"{name:<10} {total:>9.3f} "
+                  f"{total / len(self.records) * 1000:>9.1f} "
+                  f"{total / wall_total if wall_total else 0:>7.1%}")
+        print(f"{'wall':<10} {wall_total:>9.3f} "
+              f"{wall_total / len(self.records) * 1000:>9.1f}   "
+              f"p50 {pct(0.5) * 1000:.1f} ms, p95 {pct(0.95) * 1000:.1f} ms")
+        print("Slowest documents:")
+        for r in sorted(self.records, key=lambda r: r["wall_seconds"],
+                        reverse=True)[:slowest]:
+            print(f"  {r['wall_seconds'] * 1000:9.1f} ms  {r['pages']:5d} pages"
+                  f"  {r['lines']:7d} lines  {r['file']}")
+        for wall, pdf_path, out_path in self.write_profiles():
+            print(f"Profile of {pdf_path} ({wall * 1000:.1f} ms) saved to "
+                  f"{out_path}")
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
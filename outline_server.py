@@ -0,0 +1,257 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from pymupdf import FileDataError
+
+from outline_extractor import OutlineExtractor, parse_document
+
+HOST = "127.0.0.1"
+PORT = 8080
+# Documents parsed concurrently per worker process
+INFLIGHT_PER_WORKER = 2
+# Requests admitted (parsing or waiting for predict) before answering 503
+MAX_PENDING = 64
+# Micro-batching: wait up to BATCH_WAIT_MS for more documents, up to
+# BATCH_MAX_ROWS feature rows per model.predict call
+BATCH_WAIT_MS = 5
+BATCH_MAX_ROWS = 20000
+MAX_BODY_BYTES = 200 * 1024 * 1024
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 413: "Payload Too Large",
+                500: "Internal Server Error", 503: "Service Unavailable"}
+
+# Long-running outline server around an OutlineExtractor. The model is
+# loaded once; PDF parsing (parse_document) runs in a process pool and the
+# documents queued meanwhile are classified with one predict call per
+# micro-batch.
+
+
+class OutlineServer:
+    def __init__(self, workers=os.cpu_count() or 1, max_pending=MAX_PENDING,
+                 batch_wait_ms=BATCH_WAIT_MS, batch_max_rows=BATCH_MAX_ROWS,
+                 model="rf", drop_repeated=False):
+        self.extractor = OutlineExtractor(model, drop_repeated=drop_repeated)
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.parse_slots = asyncio.Semaphore(workers * INFLIGHT_PER_WORKER)
+        self.max_pending = max_pending
+        self.batch_wait = batch_wait_ms / 1000
+        self.batch_max_rows = batch_max_rows
+        self.queue = asyncio.Queue()
+        self.pending = 0
+        self.started = time.time()
+        self.counters = {"requests": 0, "completed": 0, "errors": 0,
+                         "rejected": 0, "batches": 0, "batched_docs": 0,
+                         "batched_rows": 0}
+        self.latencies = deque(maxlen=10000)
+
+    # Micro-batcher: one predict call for every document queued meanwhile
+
+    async def batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            rows = len(batch[0][0][2])
+            deadline = loop.time() + self.batch_wait
+            while rows < self.batch_max_rows:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                rows += len(item[0][2])
+            docs = [doc for doc, _ in batch]
+            try:
+                preds = await loop.run_in_executor(None, self.extractor.predict,
+                                                   docs)
+            except Exception as exc:
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+            self.counters["batches"] += 1
+            self.counters["batched_docs"] += len(batch)
+            self.counters["batched_rows"] += rows
+            for (_, future), doc_preds in zip(batch, preds):
+                future.set_result(doc_preds)
+
+    async def extract(self, source):
+        loop = asyncio.get_running_loop()
+        async with self.parse_slots:
+            doc = await loop.run_in_executor(
+                self.pool, parse_document, source, None, None,
+                self.extractor.drop_repeated)
+        if not doc[0]:
+            return self.extractor.outline(doc, [])
+        future = loop.create_future()
+        await self.queue.put((doc, future))
+        preds = await future
+        return self.extractor.outline(doc, preds)
+
+    def stats(self):
+        latencies = sorted(self.latencies)
+
+        def pct(q):
+            if not latencies:
+                return None
+            return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+        batches = self.counters["batches"]
+        return dict(self.counters,
+                    pending=self.pending,
+                    queued_for_predict=self.queue.qsize(),
+                    uptime_seconds=time.time() - self.started,
+                    mean_batch_docs=(self.counters["batched_docs"] / batches
+                                     if batches else 0.0),
+                    latency_p50=pct(0.50), latency_p99=pct(0.99))
+
+    # HTTP/1.1 handling: POST /extract, GET /health, GET /stats
+
+    async def handle_extract(self, headers, body):
+        if self.pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            return 503, {"error": "server busy"}, {"Retry-After": "1"}
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            if headers.get("content-type", "").startswith("application/json"):
+                request = json.loads(body)
+                if not (isinstance(request, dict) and
+                        isinstance(request.get("path"), str)):
+                    raise ValueError('expected {"path": "/abs/file.pdf"}')
+                source = request["path"]
+                if not os.path.isfile(source):
+                    return 404, {"error": f"no such file: {source}"}, {}
+            else:
+                source = body
+            output = await self.extract(source)
+        except ValueError as exc:
+            self.counters["errors"] += 1
+            return 400, {"error": str(exc)}, {}
+        except FileDataError as exc:
+            # Raised in the parse pool when the body or file is not a PDF
+            self.counters["errors"] += 1
+            return 400, {"error": f"not a readable PDF: {exc}"}, {}
+        except Exception as exc:
+            self.counters["errors"] += 1
+            return 500, {"error": f"{type(exc).__name__}: {exc}"}, {}
+        finally:
+            self.pending -= 1
+        self.counters["completed"] += 1
+        self.latencies.append(time.perf_counter() - start)
+        return 200, output, {}
+
+    async def route(self, method, path, headers, body):
+        if path == "/health":
+            return 200, {"status": "ok"}, {}
+        if path == "/stats":
+            return 200, self.stats(), {}
+        if path == "/extract":
+            if method != "POST":
+                return 405, {"error": "use POST"}, {}
+            return await self.handle_extract(headers, body)
+        return 404, {"error": f"unknown path {path}"}, {}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, 413, {"error": "body too large"},
+                                       {}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                self.counters["requests"] += 1
+                status, payload, extra = await self.route(
+                    method, path.split("?")[0], headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await self.respond(writer, status, payload, extra, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, extra, keep_alive):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = [f"HTTP/1.1 {status} {HTTP_REASONS[status]}",
+                "Content-Type: application/json; charset=utf-8",
+                f"Content-Length: {len(data)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{name}: {value}" for name, value in extra.items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+        await writer.drain()
+
+
+async def serve(host=HOST, port=PORT, unix_path=None, **kwargs):
+    server = OutlineServer(**kwargs)
+    batcher = asyncio.create_task(server.batcher())
+    if unix_path:
+        listener = await asyncio.start_unix_server(server.handle_connection,
+                                                   path=unix_path)
+        print(f"Serving outlines on unix:{unix_path}")
+    else:
+        listener = await asyncio.start_server(server.handle_connection,
+                                              host, port)
+        print(f"Serving outlines on http://{host}:{port}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        batcher.cancel()
+        server.pool.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="PDF Outline Extractor server (model kept warm)")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--unix', help='Listen on this Unix socket instead')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='PDF parsing processes (default: %(default)s)')
+    parser.add_argument('--model', choices=['rf', 'crf'], default='rf',
+                        help='Heading classifier (default: %(default)s)')
+    parser.add_argument('--drop-repeated', action='store_true',
+                        help='Skip running headers, footers and page numbers '
+                             'repeated across pages')
+    parser.add_argument('--max-pending', type=int, default=MAX_PENDING,
+                        help='Requests admitted before answering 503 '
+                             '(default: %(default)s)')
+    parser.add_argument('--batch-wait-ms', type=float, default=BATCH_WAIT_MS,
+                        help='Time to gather documents into one predict call '
+                             '(default: %(default)s)')
+    parser.add_argument('--batch-max-rows', type=int, default=BATCH_MAX_ROWS,
+                        help='Maximum feature rows per predict call '
+                             '(default: %(default)s)')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix,
+                          workers=args.workers, max_pending=args.max_pending,
+                          batch_wait_ms=args.batch_wait_ms,
+                          batch_max_rows=args.batch_max_rows,
+                          model=args.model,
+                          drop_repeated=args.drop_repeated))
+    except KeyboardInterrupt:
+        pass
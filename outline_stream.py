@@ -0,0 +1,83 @@
+import os
+import sys
+import json
+import glob
+import time
+
+# Seconds between directory scans in watch mode
+POLL_SECONDS = 1.0
+# Rotate the NDJSON file once it grows past this size
+NDJSON_MAX_BYTES = 256 * 1024 * 1024
+
+# Path sources for streaming mode
+
+
+def stdin_paths(stream=None):
+    for line in stream or sys.stdin:
+        path = line.strip()
+        if path:
+            yield path
+
+
+def watch_paths(input_dir, poll_seconds=POLL_SECONDS, pattern="*.pdf"):
+    # Yields each PDF once its size and mtime are unchanged across two scans,
+    # i.e. once the writer has finished it. A file that is rewritten later is
+    # yielded again. Runs until interrupted.
+    last_seen = {}
+    done = {}
+    while True:
+        current = {}
+        for path in glob.glob(os.path.join(input_dir, pattern)):
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            current[path] = (st.st_size, st.st_mtime_ns)
+        for path in sorted(current):
+            state = current[path]
+            if state[0] and last_seen.get(path) == state and done.get(path) != state:
+                done[path] = state
+                yield path
+        last_seen = current
+        time.sleep(poll_seconds)
+
+# NDJSON sink: one JSON record per line to stdout or to a file that is
+# rotated to <path>.1, <path>.2, ... once it exceeds max_bytes.
+
+
+class NdjsonWriter:
+    def __init__(self, path="-", max_bytes=NDJSON_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.file = None
+        self.stdout = sys.stdout
+        if path != "-":
+            self._open()
+
+    def _open(self):
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    def _rotate(self):
+        self.file.close()
+        n = 1
+        while os.path.exists(f"{self.path}.{n}"):
+            n += 1
+        os.replace(self.path, f"{self.path}.{n}")
+        self._open()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        if self.file is None:
+            self.stdout.write(line)
+            self.stdout.flush()
+            return
+        size = self.file.tell()
+        if size and size + len(line.encode("utf-8")) > self.max_bytes:
+            self._rotate()
+        self.file.write(line)
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
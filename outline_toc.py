@@ -0,0 +1,62 @@
+import re
+
+# Bookmarks fast path: when a PDF's embedded outline (PyMuPDF get_toc) passes
+# the checks below it is emitted as-is, without extracting text or running
+# the model.
+
+# Fewer bookmarks than this are not trusted as an outline
+TOC_MIN_ENTRIES = 2
+# Documents with at least TOC_COVERAGE_PAGES pages need bookmarks spanning
+# at least TOC_MIN_COVERAGE of their pages
+TOC_COVERAGE_PAGES = 4
+TOC_MIN_COVERAGE = 0.5
+# Reject outlines in which more than this share of titles are repeats
+TOC_MAX_DUPLICATES = 0.5
+# Deepest bookmark level emitted (H1..H3); deeper entries are dropped
+MAX_LEVEL = 3
+# Metadata titles that are really file names ("Microsoft Word - x.doc")
+FILENAME_TITLE = re.compile(r"\.\w{2,4}\s*$|^Microsoft Word - ", re.IGNORECASE)
+
+
+def check_toc(toc, page_count):
+    # Reason the bookmarks are not usable, or None if they are
+    if len(toc) < TOC_MIN_ENTRIES:
+        return f"{len(toc)} bookmark(s), at least {TOC_MIN_ENTRIES} needed"
+    levels = [level for level, _, _ in toc]
+    titles = [title.strip() for _, title, _ in toc]
+    pages = [page for _, _, page in toc]
+    if any(page < 1 or page > page_count for page in pages):
+        return "bookmarks point outside the document"
+    if levels[0] != 1 or any(b - a > 1 for a, b in zip(levels, levels[1:])):
+        return "bookmark levels skip a level"
+    if not all(titles):
+        return "empty bookmark titles"
+    if any(b < a for a, b in zip(pages, pages[1:])):
+        return "bookmarks are not in page order"
+    if 1 - len(set(titles)) / len(titles) > TOC_MAX_DUPLICATES:
+        return "mostly repeated bookmark titles"
+    if page_count >= TOC_COVERAGE_PAGES:
+        coverage = (max(pages) - min(pages) + 1) / page_count
+        if coverage < TOC_MIN_COVERAGE:
+            return f"bookmarks cover {coverage:.0%} of the pages"
+    return None
+
+
+def toc_title(doc, toc):
+    title = (doc.metadata or {}).get("title", "").strip()
+    if title and not FILENAME_TITLE.search(title):
+        return title
+    return toc[0][1].strip()
+
+
+def toc_outline(doc):
+    # Returns ({title, outline} or None, reason the bookmarks were rejected)
+    toc = doc.get_toc(simple=True)
+    if not toc:
+        return None, "no bookmarks"
+    reason = check_toc(toc, doc.page_count)
+    if reason is not None:
+        return None, reason
+    outline = [{"level": f"H{level}", "text": title.strip(), "page": page}
+               for level, title, page in toc if level <= MAX_LEVEL]
+    return {"title": toc_title(doc, toc), "outline": outline}, None
@@ -0,0 +1,309 @@
+import numpy as np
+
+# Bump when the feature definitions below change; stored alongside
+# cached results and exported models.
+FEATURE_SET_VERSION = "1.0"
+
+# Per-line span attributes collected from PyMuPDF
+LINE_COLUMNS = ['font_size', 'is_bold', 'is_italic',
+                'rel_y', 'length', 'num_words', 'x', 'color']
+
+# Model input columns, in the order the classifiers were trained on
+FEATURE_COLUMNS = [
+    'font_size', 'is_bold', 'is_italic', 'rel_y', 'length', 'num_words', 'x', 'color',
+    'text_length', 'starts_with_number', 'ends_with_colon', 'all_caps', 'title_case',
+    'has_numbers', 'has_special_chars', 'font_size_large', 'font_size_medium',
+    'font_size_small', 'position_top', 'position_middle', 'position_bottom',
+    'short_text', 'medium_text', 'long_text', 'single_word', 'few_words', 'many_words'
+]
+
+SPECIAL_CHARS = '()[]{}'
+
+# Column order of the training CSVs written by the dataset scripts
+TRAINING_COLUMNS = (['pdf_file', 'page', 'text'] + LINE_COLUMNS +
+                    ['heading_level'] + FEATURE_COLUMNS[len(LINE_COLUMNS):])
+
+# Helper: per-line records for one page
+
+
+def iter_page_lines(page, page_num):
+    height = page.rect.height
+    blocks = page.get_text("dict")["blocks"]
+    for block in blocks:
+        if block["type"] != 0:
+            continue  # skip images, etc.
+        for line in block["lines"]:
+            line_text = " ".join([span["text"]
+                                  for span in line["spans"]]).strip()
+            if not line_text:
+                continue
+            span = line["spans"][0]
+            is_bold = int("Bold" in span["font"])
+            is_italic = int(
+                "Italic" in span["font"] or "Oblique" in span["font"])
+            yield (line_text, page_num, span["size"], is_bold, is_italic,
+                   line["bbox"][1] / height, len(line_text),
+                   len(line_text.split()), line["bbox"][0],
+                   span.get("color", 0))
+
+# Helper: turn line records into a dict of columns
+
+
+def line_columns(records):
+    records = list(records)
+    if records:
+        texts, pages, *values = zip(*records)
+    else:
+        texts, pages, values = (), (), [()] * len(LINE_COLUMNS)
+    cols = {'text': list(texts), 'page': np.asarray(pages, dtype=np.int64)}
+    for name, vals in zip(LINE_COLUMNS, values):
+        dtype = np.float64 if name in ('font_size', 'rel_y', 'x') else np.int64
+        cols[name] = np.asarray(vals, dtype=dtype)
+    return cols
+
+
+def collect_lines(doc, page_range=None):
+    if page_range is None:
+        page_range = (0, doc.page_count)
+    records = []
+    for page_index in range(*page_range):
+        records.extend(iter_page_lines(doc.load_page(page_index),
+                                       page_index + 1))
+    return line_columns(records)
+
+# Helper: code point lookup tables for the character predicates
+
+
+_digit_table = None
+
+
+def _digit_mask(codes):
+    global _digit_table
+    if _digit_table is None:
+        _digit_table = np.array([chr(c).isdigit() for c in range(0x10000)])
+    mask = _digit_table[np.minimum(codes, 0xFFFF)]
+    astral = codes > 0xFFFF
+    if astral.any():
+        for c in np.unique(codes[astral]):
+            mask[codes == c] = chr(c).isdigit()
+    return mask
+
+# Helper: every line's code points in one flat array, with each line's start
+# offset and length, so memory follows the total characters rather than
+# lines times the longest line
+
+
+def _code_points(texts):
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer("".join(texts).encode("utf-32-le", "surrogatepass"),
+                          dtype=np.uint32)
+    starts = np.zeros(len(texts), dtype=np.int64)
+    np.cumsum(lengths[:-1], out=starts[1:])
+    return codes, starts, lengths
+
+
+def _any_per_line(flags, starts, lengths):
+    # flags: one bool per code point; True where any of a line's are True
+    result = np.zeros(len(lengths), dtype=bool)
+    nonempty = lengths > 0
+    if nonempty.any():
+        result[nonempty] = np.logical_or.reduceat(flags, starts[nonempty])
+    return result
+
+# Feature extraction (same for training and inference). `cols` maps 'text'
+# and every name in LINE_COLUMNS to one value per line: the output of
+# line_columns() or the matching DataFrame columns.
+
+
+def compute_features(cols):
+    font_size = np.asarray(cols['font_size'], dtype=np.float64)
+    rel_y = np.asarray(cols['rel_y'], dtype=np.float64)
+    length = np.asarray(cols['length'])
+    num_words = np.asarray(cols['num_words'])
+    texts = list(map(str, cols['text']))
+    codes, starts, lengths = _code_points(texts)
+    digits = _digit_mask(codes)
+    nonempty = lengths > 0
+    starts_with_number = np.zeros(len(texts), dtype=bool)
+    starts_with_number[nonempty] = digits[starts[nonempty]]
+    feats = {name: np.asarray(cols[name]) for name in LINE_COLUMNS}
+    feats.update({
+        'text_length': lengths,
+        'starts_with_number': starts_with_number,
+        'ends_with_colon': np.fromiter((t.endswith(':') for t in texts),
+                                       dtype=bool, count=len(texts)),
+        'all_caps': np.fromiter((t.isupper() for t in texts), dtype=bool,
+                                count=len(texts)),
+        'title_case': np.fromiter((t.istitle() for t in texts), dtype=bool,
+                                  count=len(texts)),
+        'has_numbers': _any_per_line(digits, starts, lengths),
+        'has_special_chars': _any_per_line(
+            np.isin(codes, [ord(c) for c in SPECIAL_CHARS]), starts, lengths),
+        'font_size_large': font_size > 14,
+        'font_size_medium': (font_size >= 10) & (font_size <= 14),
+        'font_size_small': font_size < 10,
+        'position_top': rel_y < 0.2,
+        'position_middle': (rel_y >= 0.2) & (rel_y <= 0.8),
+        'position_bottom': rel_y > 0.8,
+        'short_text': length < 20,
+        'medium_text': (length >= 20) & (length <= 50),
+        'long_text': length > 50,
+        'single_word': num_words == 1,
+        'few_words': (num_words >= 2) & (num_words <= 5),
+        'many_words': num_words > 5,
+    })
+    for name in FEATURE_COLUMNS[len(LINE_COLUMNS):]:
+        feats[name] = feats[name].astype(np.int64)
+    return feats
+
+# Helper: (n_lines, 27) float32 model input
+
+
+def feature_matrix(cols):
+    feats = compute_features(cols)
+    X = np.empty((len(cols['text']), len(FEATURE_COLUMNS)), dtype=np.float32)
+    for i, name in enumerate(FEATURE_COLUMNS):
+        X[:, i] = feats[name]
+    return X
+
+# Helper: training table columns for one PDF, in TRAINING_COLUMNS order
+
+
+def training_columns(pdf_file, cols, heading_levels):
+    feats = compute_features(cols)
+    table = {'pdf_file': [pdf_file] * len(cols['text']),
+             'page': cols['page'], 'text': cols['text'],
+             'heading_level': list(heading_levels)}
+    for name in TRAINING_COLUMNS:
+        if name not in table:
+            table[name] = feats[name]
+    return {name: table[name] for name in TRAINING_COLUMNS}
+
+# Document font profile: character counts per rounded font size and per
+# (size, bold) style, plus the body size carrying the most text.
+
+
+def font_profile(cols):
+    sizes = np.round(np.asarray(cols['font_size'], dtype=np.float64) * 2) / 2
+    weights = np.asarray(cols['length'], dtype=np.float64)
+    bold = np.asarray(cols['is_bold']) != 0
+    profile = {'size_hist': {}, 'style_hist': {}, 'body_size': None}
+    if not len(sizes):
+        return profile
+    uniq, inv = np.unique(sizes, return_inverse=True)
+    counts = np.bincount(inv, weights=weights)
+    profile['size_hist'] = {float(s): int(c) for s, c in zip(uniq, counts)}
+    profile['body_size'] = float(uniq[counts.argmax()])
+    for is_bold in (False, True):
+        style = np.bincount(inv[bold == is_bold], weights=weights[bold == is_bold],
+                            minlength=len(uniq))
+        for s, c in zip(uniq, style):
+            if c:
+                profile['style_hist'][(float(s), is_bold)] = int(c)
+    return profile
+
+# Helper: lines that may be headings. Body-size, non-bold lines with more
+# than `max_words` words are plainly body text and can skip the model.
+
+
+def candidate_mask(cols, profile, max_words):
+    n = len(cols['text'])
+    if profile['body_size'] is None:
+        return np.ones(n, dtype=bool)
+    sizes = np.round(np.asarray(cols['font_size'], dtype=np.float64) * 2) / 2
+    body_text = ((sizes == profile['body_size']) &
+                 (np.asarray(cols['is_bold']) == 0) &
+                 (np.asarray(cols['num_words']) > max_words))
+    return ~body_text
+
+# Rule-based heading pass, the cheapest fallback of deadline mode: short lines
+# set larger than the body size are headings, the three largest such sizes
+# becoming H1-H3 (anything smaller H3), and short bold body-size lines take
+# the next level down. Returns one label string per line.
+
+RULE_MAX_WORDS = 12
+RULE_BOLD_WORDS = 8
+
+
+def rule_heading_levels(cols, profile):
+    n = len(cols['text'])
+    levels = np.full(n, 'not_heading', dtype=object)
+    if profile['body_size'] is None or not n:
+        return levels
+    body = profile['body_size']
+    sizes = np.round(np.asarray(cols['font_size'], dtype=np.float64) * 2) / 2
+    num_words = np.asarray(cols['num_words'])
+    larger = (sizes > body) & (num_words <= RULE_MAX_WORDS)
+    ranked = np.unique(sizes[larger])[::-1]
+    rank = np.minimum(np.searchsorted(-ranked, -sizes[larger]), 2)
+    levels[larger] = np.array(['H1', 'H2', 'H3'])[rank]
+    bold = ((sizes == body) & (np.asarray(cols['is_bold']) != 0) &
+            (num_words <= RULE_BOLD_WORDS))
+    levels[bold] = ['H1', 'H2', 'H3'][min(len(ranked), 2)]
+    return levels
+
+# Running headers, footers, page numbers and repeated titles: one pass over
+# the whole document keys every line on its normalized text (lowercase,
+# digits folded to '#', whitespace collapsed) and its height on the page in
+# REPEAT_Y_BAND steps. A line is boilerplate when its text appears within one
+# band of the same height on at least `min_pages` pages, and on at least
+# `min_share` of the pages between its first and last occurrence (so
+# "Chapter 2" openings far apart are kept while "Page 2 of 9" is not).
+
+REPEAT_MIN_PAGES = 3
+REPEAT_MIN_SHARE = 0.5
+REPEAT_Y_BAND = 0.02
+_DIGITS = str.maketrans("0123456789", "##########")
+
+
+def normalize_line(text):
+    return " ".join(text.lower().translate(_DIGITS).split())
+
+
+def repeated_line_mask(cols, min_pages=REPEAT_MIN_PAGES,
+                       min_share=REPEAT_MIN_SHARE, y_band=REPEAT_Y_BAND):
+    n = len(cols['text'])
+    if not n:
+        return np.zeros(0, dtype=bool)
+    texts = np.asarray([normalize_line(t) for t in cols['text']])
+    _, group = np.unique(texts, return_inverse=True)
+    group = group.reshape(-1).astype(np.int64)
+    pages = np.asarray(cols['page'], dtype=np.int64)
+    pages = pages - pages.min()
+    # Bands 1..n_bands, with an empty band either side so neighbours never
+    # cross into another text's keys
+    n_bands = int(np.ceil(1 / y_band)) + 1
+    rel_y = np.clip(np.asarray(cols['rel_y'], dtype=np.float64), 0.0, 1.0)
+    band = np.rint(rel_y / y_band).astype(np.int64) + 1
+    key = group * (n_bands + 2) + band
+    # Sorted distinct (key, page) pairs, each line also entered one band up
+    # and down; a key's pages are then one contiguous run
+    span = int(pages.max()) + 1
+    near = np.unique(np.concatenate([(key + d) * span + pages
+                                     for d in (-1, 0, 1)]))
+    near_key, near_page = np.divmod(near, span)
+    lo = np.searchsorted(near_key, key, side='left')
+    hi = np.searchsorted(near_key, key, side='right')
+    count = hi - lo
+    extent = near_page[hi - 1] - near_page[lo] + 1
+    return (count >= min_pages) & (count >= min_share * extent)
+
+# Helper: row subset and concatenation of line columns
+
+
+def select_rows(cols, mask):
+    mask = np.asarray(mask, dtype=bool)
+    selected = {name: values[mask] for name, values in cols.items()
+                if name != 'text'}
+    selected['text'] = [t for t, keep in zip(cols['text'], mask) if keep]
+    return selected
+
+
+def concat_columns(parts):
+    parts = list(parts)
+    if not parts:
+        return line_columns([])
+    cols = {name: np.concatenate([p[name] for p in parts])
+            for name in parts[0] if name != 'text'}
+    cols['text'] = [t for p in parts for t in p['text']]
+    return cols
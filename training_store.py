@@ -0,0 +1,271 @@
+import os
+import json
+import pickle
+import numpy as np
+
+from atomic_files import atomic_write
+from compact_forest import (COMPACT_MODEL_PATH, MODEL_DIR, MODEL_PATH,
+                            export_forest)
+from outline_cache import bytes_digest, file_digest
+from pdf_features import FEATURE_COLUMNS, FEATURE_SET_VERSION
+
+STORE_DIR = os.path.join(MODEL_DIR, "store")
+# Label indices of a new store, as used by the shipped models
+LABELS = ["H1", "H2", "H3", "not_heading"]
+# Forest size of a full rebuild, and trees added per incremental update
+N_ESTIMATORS = 100
+ADD_TREES = 20
+# Rebuild from scratch once incremental updates grow the forest past this
+MAX_TREES = 300
+# Old rows per class replayed next to the new batch in an incremental update
+REPLAY_PER_CLASS = 500
+
+# Append-only training store. Every batch is a float32 feature matrix and an
+# int32 label vector saved as .npy files and read back memory-mapped. The
+# manifest lists the batches, a label map that only ever grows (existing
+# labels keep their index) and which batches the saved model was trained on.
+
+
+class TrainingStore:
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        self.manifest_path = os.path.join(store_dir, "manifest.json")
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.manifest = json.load(f)
+        else:
+            self.manifest = {"feature_columns": FEATURE_COLUMNS,
+                             "feature_set_version": FEATURE_SET_VERSION,
+                             "label_map": {label: i for i, label in
+                                           enumerate(LABELS)},
+                             "batches": [], "next_batch": 1,
+                             "model": None}
+        if self.manifest["feature_columns"] != FEATURE_COLUMNS:
+            raise ValueError(f"{store_dir} was built for different feature "
+                             "columns; remove it to rebuild")
+
+    def save(self):
+        data = json.dumps(self.manifest, indent=2).encode("utf-8")
+        atomic_write(self.manifest_path, lambda f: f.write(data))
+
+    @property
+    def label_map(self):
+        return self.manifest["label_map"]
+
+    def inv_label_map(self):
+        return {i: label for label, i in self.label_map.items()}
+
+    def encode(self, labels):
+        # New labels get the next free index, in sorted order
+        label_map = self.label_map
+        for label in sorted(set(labels) - set(label_map)):
+            label_map[label] = len(label_map)
+        return np.asarray([label_map[label] for label in labels],
+                          dtype=np.int32)
+
+    def batch_names(self):
+        return [batch["name"] for batch in self.manifest["batches"]]
+
+    def _paths(self, name):
+        return (os.path.join(self.store_dir, f"{name}-X.npy"),
+                os.path.join(self.store_dir, f"{name}-y.npy"))
+
+    def add_batch(self, X, labels, source="", digest=""):
+        name = f"batch-{self.manifest['next_batch']:05d}"
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        y = self.encode(labels)
+        x_path, y_path = self._paths(name)
+        atomic_write(x_path, lambda f: np.save(f, X))
+        atomic_write(y_path, lambda f: np.save(f, y))
+        self.manifest["next_batch"] += 1
+        self.manifest["batches"].append({"name": name, "rows": len(y),
+                                         "source": source, "digest": digest})
+        self.save()
+        return name
+
+    def remove_batch(self, name):
+        self.manifest["batches"] = [b for b in self.manifest["batches"]
+                                    if b["name"] != name]
+        self.save()
+        for path in self._paths(name):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def import_table(self, source, digest, load):
+        # Add `source` as a batch unless the same content is already stored.
+        # A changed source replaces its old batch. `load` returns (X, labels)
+        # and is only called when the source is new or changed.
+        for batch in self.manifest["batches"]:
+            if batch["source"] == source:
+                if batch["digest"] == digest:
+                    return None
+                self.remove_batch(batch["name"])
+                break
+        X, labels = load()
+        return self.add_batch(X, labels, source, digest)
+
+    def load_batch(self, name):
+        x_path, y_path = self._paths(name)
+        return (np.load(x_path, mmap_mode="r"), np.load(y_path, mmap_mode="r"))
+
+    def arrays(self, names=None):
+        names = self.batch_names() if names is None else names
+        if not names:
+            return (np.empty((0, len(FEATURE_COLUMNS)), dtype=np.float32),
+                    np.empty(0, dtype=np.int32))
+        parts = [self.load_batch(name) for name in names]
+        return (np.concatenate([X for X, _ in parts]),
+                np.concatenate([y for _, y in parts]))
+
+    def label_counts(self):
+        counts = np.zeros(len(self.label_map), dtype=np.int64)
+        for name in self.batch_names():
+            y = np.asarray(self.load_batch(name)[1])
+            counts += np.bincount(y, minlength=len(counts))
+        return counts
+
+    def sample_per_class(self, names, per_class, rng):
+        # Up to `per_class` random rows of every label from the given batches;
+        # only the sampled feature rows are read from the memory maps.
+        parts = [self.load_batch(name) for name in names]
+        if not parts:
+            return self.arrays([])
+        y_all = np.concatenate([np.asarray(y) for _, y in parts])
+        offsets = np.cumsum([0] + [len(y) for _, y in parts])
+        picked = []
+        for label in np.unique(y_all):
+            rows = np.flatnonzero(y_all == label)
+            if len(rows) > per_class:
+                rows = rng.choice(rows, per_class, replace=False)
+            picked.append(rows)
+        picked = np.sort(np.concatenate(picked))
+        X = np.empty((len(picked), len(FEATURE_COLUMNS)), dtype=np.float32)
+        which = np.searchsorted(offsets, picked, side="right") - 1
+        for i, (X_batch, _) in enumerate(parts):
+            sel = which == i
+            X[sel] = X_batch[picked[sel] - offsets[i]]
+        return X, y_all[picked]
+
+    def record_model(self, model_path, clf, names):
+        self.manifest["model"] = {"digest": file_digest(model_path),
+                                  "batches": list(names),
+                                  "classes": [int(c) for c in clf.classes_],
+                                  "n_trees": len(clf.estimators_)}
+        self.save()
+
+# Helper: the CSV as one batch per pdf_file, each keyed "<csv>#<pdf_file>"
+# with a digest of its rows, so appended documents become new batches (and
+# an incremental update) while a changed document replaces only its own.
+# Documents no longer in the CSV are removed. The file is only parsed when
+# its digest differs from the last import.
+
+
+def import_csv(store, csv_path):
+    source = os.path.normpath(csv_path)
+    digest = file_digest(csv_path)
+    tables = store.manifest.setdefault("tables", {})
+    if tables.get(source) == digest:
+        return []
+    import pandas as pd
+    df = pd.read_csv(csv_path)
+    added, groups = [], set()
+    for pdf_file, group in df.groupby('pdf_file', sort=False):
+        X = group[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+        labels = group['heading_level'].astype(str).tolist()
+        group_source = f"{source}#{pdf_file}"
+        groups.add(group_source)
+        name = store.import_table(
+            group_source,
+            bytes_digest(X.tobytes() + "\n".join(labels).encode("utf-8")),
+            lambda X=X, labels=labels: (X, labels))
+        if name is not None:
+            added.append(name)
+    for batch in list(store.manifest["batches"]):
+        # Whole-CSV batches of older stores and documents since removed
+        if batch["source"] == source or (
+                batch["source"].startswith(f"{source}#") and
+                batch["source"] not in groups):
+            store.remove_batch(batch["name"])
+    tables[source] = digest
+    store.save()
+    return added
+
+# Retrain the RandomForest from the store. A full rebuild fits N_ESTIMATORS
+# trees on every batch. Otherwise batches added since the last fit are learnt
+# by ADD_TREES new trees (sklearn warm_start) trained on the new rows plus a
+# per-class replay sample of the old ones, so every class is present. Class
+# weights are balanced over the whole store. Returns (clf, label_map,
+# inv_label_map, mode) with mode "full", "incremental" or "unchanged".
+
+
+def _save_model(store, clf, names, model_path, compact_path):
+    with open(model_path, 'wb') as f:
+        pickle.dump({'model': clf, 'label_map': dict(store.label_map),
+                     'inv_label_map': store.inv_label_map()}, f)
+    print(f"Model trained and saved to {model_path}")
+    export_forest(clf, store.inv_label_map(), compact_path,
+                  file_digest(model_path))
+    store.record_model(model_path, clf, names)
+
+
+def rebuild_reason(store, model_path, add_trees=ADD_TREES,
+                   max_trees=MAX_TREES):
+    # Why an incremental update is not possible (None if it is)
+    record = store.manifest["model"]
+    if record is None or not os.path.exists(model_path):
+        return "no model trained from this store"
+    if record["digest"] != file_digest(model_path):
+        return f"{model_path} was not trained from this store"
+    names = store.batch_names()
+    if not set(record["batches"]) <= set(names):
+        return "training batches were removed or replaced"
+    if set(np.flatnonzero(store.label_counts())) - set(record["classes"]):
+        return "new labels"
+    if record["n_trees"] + add_trees > max_trees:
+        return f"forest would exceed {max_trees} trees"
+    return None
+
+
+def retrain_forest(store, model_path=MODEL_PATH,
+                   compact_path=COMPACT_MODEL_PATH, full=False,
+                   n_estimators=N_ESTIMATORS, add_trees=ADD_TREES,
+                   max_trees=MAX_TREES, replay_per_class=REPLAY_PER_CLASS,
+                   random_state=42):
+    from sklearn.ensemble import RandomForestClassifier
+    names = store.batch_names()
+    if not names:
+        raise ValueError(f"No training data in {store.store_dir}")
+    reason = "requested" if full else rebuild_reason(store, model_path,
+                                                      add_trees, max_trees)
+    label_map, inv_label_map = dict(store.label_map), store.inv_label_map()
+    if reason is not None:
+        print(f"Full rebuild ({reason}): {n_estimators} trees")
+        X, y = store.arrays(names)
+        clf = RandomForestClassifier(n_estimators=n_estimators,
+                                     random_state=random_state,
+                                     class_weight='balanced')
+        clf.fit(X, y)
+        _save_model(store, clf, names, model_path, compact_path)
+        return clf, label_map, inv_label_map, "full"
+    with open(model_path, 'rb') as f:
+        clf = pickle.load(f)['model']
+    trained = store.manifest["model"]["batches"]
+    new = [name for name in names if name not in trained]
+    if not new:
+        print("Model is up to date with the training store")
+        return clf, label_map, inv_label_map, "unchanged"
+    X_new, y_new = store.arrays(new)
+    X_old, y_old = store.sample_per_class(
+        trained, replay_per_class, np.random.default_rng(len(clf.estimators_)))
+    X, y = np.concatenate([X_new, X_old]), np.concatenate([y_new, y_old])
+    counts = store.label_counts()
+    weights = counts.sum() / (len(label_map) * np.maximum(counts, 1))
+    print(f"Incremental update: {add_trees} trees on {len(y_new)} new rows "
+          f"+ {len(y_old)} replayed rows")
+    clf.set_params(warm_start=True, class_weight=None,
+                   n_estimators=len(clf.estimators_) + add_trees)
+    clf.fit(X, y, sample_weight=weights[y])
+    clf.set_params(warm_start=False, class_weight='balanced')
+    _save_model(store, clf, names, model_path, compact_path)
+    return clf, label_map, inv_label_map, "incremental"